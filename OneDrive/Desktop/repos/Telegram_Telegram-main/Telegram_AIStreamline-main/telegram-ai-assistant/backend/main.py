@@ -84,12 +84,13 @@ async def startup_event():
         telegram_bot.start_polling()
 
     await redis_client.ping()
-    logger.info("Startup complete")
+    logger.info(f"Startup complete (event loop: {type(asyncio.get_running_loop()).__name__})")
 
 # Shutdown event
 @app.on_event("shutdown")
 async def shutdown_event():
     telegram_bot.stop()
+    await plugin_manager.close()
     await redis_client.close()
 
 # Global exception handler
@@ -104,4 +105,6 @@ if __name__ == "__main__":
     import uvicorn
 
     port = int(os.environ.get("PORT", 8000))
-    uvicorn.run("backend.main:app", host="0.0.0.0", port=port)
+    # loop="auto" runs on uvloop when it is installed (uvicorn[standard]) and
+    # falls back to the default asyncio loop otherwise, e.g. on Windows
+    uvicorn.run("backend.main:app", host="0.0.0.0", port=port, loop="auto")
@@ -12,6 +12,7 @@ class PluginManager:
         self.plugins = {}
         self.plugins_config = self._load_plugins_config()
         self._initialize_plugins()
+        self._build_command_dispatch()
         
         logger.info("Plugin Manager initialized successfully")
 
@@ -97,6 +98,68 @@ class PluginManager:
             logger.error(f"Error initializing plugins: {str(e)}")
             raise
 
+    def _build_command_dispatch(self) -> None:
+        """Build command tables for the active plugins; handlers take the incoming message"""
+        # Commands are "<prefix>_<command>"; the prefix selects the plugin
+        self._command_handlers = {
+            "voice": ("voice_command", self._handle_voice_command),
+            "crm": ("crm", self._handle_crm_command),
+            "social": ("social_media", self._handle_social_command),
+            "msg": ("messaging", self._handle_messaging_command),
+            "analytics": ("analytics", self._handle_analytics_command),
+            "lead": ("lead_nurturing", self._handle_lead_command)
+        }
+
+        crm = self.plugins.get("crm")
+        self._crm_dispatch = {
+            "sync": lambda message: crm.sync_all(),
+            "create_contact": lambda message: crm.create_contact(message["data"]),
+            "get_customer": lambda message: crm.get_customer_info(message["data"]["email"])
+        } if crm else {}
+
+        social = self.plugins.get("social_media")
+        self._social_dispatch = {
+            "post": lambda message: social.post_to_all(message["data"]),
+            "analytics": lambda message: social.get_analytics()
+        } if social else {}
+
+        messaging = self.plugins.get("messaging")
+        self._messaging_dispatch = {
+            "email": lambda message: messaging.send_email(
+                message["data"]["to"],
+                message["data"]["subject"],
+                message["data"]["content"]
+            ),
+            "sms": lambda message: messaging.send_sms(
+                message["data"]["to"],
+                message["data"]["message"]
+            ),
+            "bulk_email": lambda message: messaging.send_bulk_email(
+                message["data"]["recipients"],
+                message["data"]["subject"],
+                message["data"]["content"]
+            ),
+            "bulk_sms": lambda message: messaging.send_bulk_sms(
+                message["data"]["recipients"],
+                message["data"]["message"]
+            )
+        } if messaging else {}
+
+        analytics = self.plugins.get("analytics")
+        self._analytics_dispatch = {
+            "report": lambda message: analytics.generate_report(
+                message["data"]["report_type"],
+                message["data"].get("start_date"),
+                message["data"].get("end_date"),
+                message["data"].get("filters")
+            )
+        } if analytics else {}
+
+        lead = self.plugins.get("lead_nurturing")
+        self._lead_dispatch = {
+            "nurture": lambda message: lead.nurture_lead(message["data"])
+        } if lead else {}
+
     def get_plugin(self, plugin_name: str) -> Optional[Any]:
         """Get a plugin instance by name"""
         return self.plugins.get(plugin_name)
@@ -109,11 +172,19 @@ class PluginManager:
         """Check if a plugin is active"""
         return plugin_name in self.plugins
 
+    async def close(self) -> None:
+        """Close HTTP sessions held by active plugins"""
+        for plugin_key in ("voice_command", "social_media"):
+            plugin = self.plugins.get(plugin_key)
+            if plugin is not None:
+                await plugin.close()
+
     def reload_configuration(self) -> bool:
         """Reload plugins configuration"""
         try:
             self.plugins_config = self._load_plugins_config()
             self._initialize_plugins()
+            self._build_command_dispatch()
             return True
         except Exception as e:
             logger.error(f"Error reloading configuration: {str(e)}")
@@ -153,114 +224,59 @@ class PluginManager:
 
     async def _process_command(self, message: Dict[str, Any], response: Dict[str, Any]):
         """Process specific command types"""
-        command = message["command"]
-        
-        command_handlers = {
-            "voice": ("voice_command", self._handle_voice_command),
-            "crm": ("crm", self._handle_crm_command),
-            "social": ("social_media", self._handle_social_command),
-            "msg": ("messaging", self._handle_messaging_command),
-            "analytics": ("analytics", self._handle_analytics_command),
-            "lead": ("lead_nurturing", self._handle_lead_command)
-        }
+        prefix, _, command = message["command"].partition("_")
+        plugin_key, handler = self._command_handlers.get(prefix, (None, None))
+        if plugin_key not in self.plugins:
+            return
 
-        for prefix, (plugin_key, handler) in command_handlers.items():
-            if command.startswith(prefix) and plugin_key in self.plugins:
-                try:
-                    result = await handler(message)
-                    response["responses"].append({
-                        "plugin": plugin_key,
-                        "response": result
-                    })
-                    response["processed"] = True
-                except Exception as e:
-                    logger.error(f"Error handling {prefix} command: {str(e)}")
-                    response["errors"].append(str(e))
-
-    async def _handle_voice_command(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            result = await handler(command, message)
+            response["responses"].append({
+                "plugin": plugin_key,
+                "response": result
+            })
+            response["processed"] = True
+        except Exception as e:
+            logger.error(f"Error handling {prefix} command: {str(e)}")
+            response["errors"].append(str(e))
+
+    async def _handle_voice_command(self, command: str, message: Dict[str, Any]) -> Dict[str, Any]:
         """Handle voice command processing"""
         return await self.plugins["voice_command"].process_voice_message(
             message["voice_file"]
         )
 
-    async def _handle_crm_command(self, message: Dict[str, Any]) -> Dict[str, Any]:
+    async def _handle_crm_command(self, command: str, message: Dict[str, Any]) -> Dict[str, Any]:
         """Handle CRM-related commands"""
-        crm_plugin = self.plugins["crm"]
-        command = message["command"].replace("crm_", "")
-
-        command_map = {
-            "sync": crm_plugin.sync_all,
-            "create_contact": lambda: crm_plugin.create_contact(message["data"]),
-            "get_customer": lambda: crm_plugin.get_customer_info(message["data"]["email"])
-        }
-
-        if command in command_map:
-            return await command_map[command]()
-        raise ValueError(f"Unknown CRM command: {command}")
+        handler = self._crm_dispatch.get(command)
+        if handler is None:
+            raise ValueError(f"Unknown CRM command: {command}")
+        return await handler(message)
 
-    async def _handle_social_command(self, message: Dict[str, Any]) -> Dict[str, Any]:
+    async def _handle_social_command(self, command: str, message: Dict[str, Any]) -> Dict[str, Any]:
         """Handle social media-related commands"""
-        social_plugin = self.plugins["social_media"]
-        command = message["command"].replace("social_", "")
+        handler = self._social_dispatch.get(command)
+        if handler is None:
+            raise ValueError(f"Unknown social media command: {command}")
+        return await handler(message)
 
-        command_map = {
-            "post": lambda: social_plugin.post_to_all(message["data"]),
-            "analytics": social_plugin.get_analytics
-        }
-
-        if command in command_map:
-            return await command_map[command]()
-        raise ValueError(f"Unknown social media command: {command}")
-
-    async def _handle_messaging_command(self, message: Dict[str, Any]) -> Dict[str, Any]:
+    async def _handle_messaging_command(self, command: str, message: Dict[str, Any]) -> Dict[str, Any]:
         """Handle messaging-related commands"""
-        messaging_plugin = self.plugins["messaging"]
-        command = message["command"].replace("msg_", "")
-
-        command_map = {
-            "email": lambda: messaging_plugin.send_email(
-                message["data"]["to"],
-                message["data"]["subject"],
-                message["data"]["content"]
-            ),
-            "sms": lambda: messaging_plugin.send_sms(
-                message["data"]["to"],
-                message["data"]["message"]
-            ),
-            "bulk_email": lambda: messaging_plugin.send_bulk_email(
-                message["data"]["recipients"],
-                message["data"]["subject"],
-                message["data"]["content"]
-            ),
-            "bulk_sms": lambda: messaging_plugin.send_bulk_sms(
-                message["data"]["recipients"],
-                message["data"]["message"]
-            )
-        }
-
-        if command in command_map:
-            return await command_map[command]()
-        raise ValueError(f"Unknown messaging command: {command}")
+        handler = self._messaging_dispatch.get(command)
+        if handler is None:
+            raise ValueError(f"Unknown messaging command: {command}")
+        return await handler(message)
 
-    async def _handle_analytics_command(self, message: Dict[str, Any]) -> Dict[str, Any]:
+    async def _handle_analytics_command(self, command: str, message: Dict[str, Any]) -> Dict[str, Any]:
         """Handle analytics-related commands"""
-        analytics_plugin = self.plugins["analytics"]
-        command = message["command"].replace("analytics_", "")
+        handler = self._analytics_dispatch.get(command)
+        if handler is None:
+            raise ValueError(f"Unknown analytics command: {command}")
+        return await handler(message)
 
-        if command == "report":
-            return await analytics_plugin.generate_report(
-                message["data"]["report_type"],
-                message["data"].get("start_date"),
-                message["data"].get("end_date"),
-                message["data"].get("filters")
-            )
-        raise ValueError(f"Unknown analytics command: {command}")
-
-    async def _handle_lead_command(self, message: Dict[str, Any]) -> Dict[str, Any]:
+    async def _handle_lead_command(self, command: str, message: Dict[str, Any]) -> Dict[str, Any]:
         """Handle lead nurturing commands"""
-        lead_plugin = self.plugins["lead_nurturing"]
-        command = message["command"].replace("lead_", "")
-
-        if command == "nurture":
-            return await lead_plugin.nurture_lead(message["data"])
-        raise ValueError(f"Unknown lead nurturing command: {command}")
+        handler = self._lead_dispatch.get(command)
+        if handler is None:
+            raise ValueError(f"Unknown lead nurturing command: {command}")
+        return await handler(message)
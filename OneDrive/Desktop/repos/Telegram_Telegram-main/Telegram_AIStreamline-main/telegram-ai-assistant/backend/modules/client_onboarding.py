@@ -27,6 +27,10 @@ class ClientOnboarding:
         
         logger.info("Client Onboarding Automation initialized")
 
+    async def close(self) -> None:
+        """Close the whitelabel webhook HTTP session"""
+        await self.whitelabel.close()
+
     def _load_steps_template(self) -> Dict[str, Any]:
         """Load onboarding steps template"""
         try:
@@ -25,6 +25,10 @@ class ContentAutomation:
         
         logger.info("Content Automation initialized")
 
+    async def close(self) -> None:
+        """Close HTTP sessions held by the posting clients"""
+        await self.social_media.close()
+
     async def generate_website_content(self, website_data: Dict[str, Any]) -> Dict[str, Any]:
         """Generate website content using AI"""
         try:
@@ -0,0 +1,40 @@
+import time
+from collections import OrderedDict
+from typing import Tuple
+from sentry_config import capture_exception
+
+# Identical exceptions reported more often than this per window are dropped
+REPORT_WINDOW_SECONDS = 60
+MAX_REPORTS_PER_WINDOW = 10
+MAX_TRACKED_EXCEPTIONS = 1024
+
+# (exception type, message prefix) -> (window start, reports in window)
+_recent_exceptions: "OrderedDict[Tuple[str, str], Tuple[float, int]]" = OrderedDict()
+
+
+def _should_report(exc: BaseException, window: float, max_per_window: int) -> bool:
+    """Count a report for this exception and decide whether it is under the cap"""
+    key = (type(exc).__name__, str(exc)[:128])
+    now = time.monotonic()
+    
+    window_start, count = _recent_exceptions.get(key, (now, 0))
+    if now - window_start >= window:
+        window_start, count = now, 0
+    if count >= max_per_window:
+        return False
+    
+    _recent_exceptions[key] = (window_start, count + 1)
+    _recent_exceptions.move_to_end(key)
+    if len(_recent_exceptions) > MAX_TRACKED_EXCEPTIONS:
+        _recent_exceptions.popitem(last=False)
+    return True
+
+
+def capture_exception_throttled(exc: BaseException,
+                                window: float = REPORT_WINDOW_SECONDS,
+                                max_per_window: int = MAX_REPORTS_PER_WINDOW) -> bool:
+    """Send an exception to Sentry unless identical ones already hit the cap"""
+    if not _should_report(exc, window, max_per_window):
+        return False
+    capture_exception(exc)
+    return True
@@ -1,71 +1,171 @@
 import logging
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Iterable, List, Optional, Tuple, Union
 import aiohttp
 import asyncio
+import functools
+import itertools
+import time
+from dataclasses import asdict, dataclass, field
 from datetime import datetime, timedelta
-import json
+import orjson
 from pathlib import Path
-from sentry_config import capture_exception
+from .error_reporting import capture_exception_throttled
 from .email_sms_automation import EmailSMSAutomation
 from .analytics_reporting import AnalyticsReporting
 
 logger = logging.getLogger(__name__)
 
+# Disambiguates campaigns created within the same nanosecond tick
+_campaign_counter = itertools.count(1)
+
+# Minimum match score for a user to be placed in an audience segment
+MIN_SEGMENT_SCORE = 3
+
+# Per ad channel: (campaign setting, marketing config key providing its default)
+AD_CHANNEL_SETTINGS = {
+    "google_ads": (("campaign_types", "campaign_types"), ("keywords", "target_keywords")),
+    "facebook_ads": (("campaign_types", "campaign_types"), ("targeting", "targeting")),
+    "linkedin_ads": (("campaign_types", "campaign_types"), ("targeting", "targeting"))
+}
+
+@dataclass(slots=True)
+class CampaignMetrics:
+    """Paid-advertising metrics for a campaign or one of its ad channels"""
+    impressions: int = 0
+    clicks: int = 0
+    conversions: int = 0
+    cost: float = 0
+
+
+@dataclass(slots=True)
+class EmailMetrics:
+    """Metrics for an email campaign channel"""
+    sent: int = 0
+    opened: int = 0
+    clicked: int = 0
+    converted: int = 0
+
+
+@dataclass(slots=True)
+class ChannelState:
+    """Tracking state for one channel of a campaign"""
+    metrics: Union[CampaignMetrics, EmailMetrics]
+    settings: Dict[str, Any] = field(default_factory=dict)
+    status: str = "active"
+
+
+@dataclass(slots=True)
+class Campaign:
+    """Tracking state for a marketing campaign"""
+    started_at: str
+    status: str = "active"
+    metrics: CampaignMetrics = field(default_factory=CampaignMetrics)
+    channels: Dict[str, ChannelState] = field(default_factory=dict)
+    failed_channels: Dict[str, str] = field(default_factory=dict)
+
+
+# (segment, role, company_size, pain_point_mask, channels, content_topics)
+AudienceSegment = Tuple[str, str, str, int, List[str], List[str]]
+
+
+def _pain_point_mask(pain_points: Iterable[str], pain_point_bits: Dict[str, int]) -> int:
+    """Encode pain points as a bitmask; unknown pain points match no segment"""
+    mask = 0
+    for pain_point in pain_points:
+        mask |= pain_point_bits.get(pain_point, 0)
+    return mask
+
+
+def _build_audience_segments(marketing_config: Dict[str, Any]) -> Tuple[Tuple[AudienceSegment, ...], Dict[str, int]]:
+    """Precompute per-segment persona data used for audience matching"""
+    audiences = marketing_config.get("target_audiences", {})
+    
+    # Assign one bit per distinct pain point across all personas
+    pain_point_bits: Dict[str, int] = {}
+    for data in audiences.values():
+        for pain_point in data["persona"]["pain_points"]:
+            if pain_point not in pain_point_bits:
+                pain_point_bits[pain_point] = 1 << len(pain_point_bits)
+    
+    segments = []
+    for segment, data in audiences.items():
+        persona = data["persona"]
+        segments.append((
+            segment,
+            persona["role"].lower(),
+            persona["company_size"],
+            _pain_point_mask(persona["pain_points"], pain_point_bits),
+            data["channels"],
+            data["content_topics"]
+        ))
+    return tuple(segments), pain_point_bits
+
+
+@functools.lru_cache(maxsize=1)
+def _load_marketing_config_cached(path_str: str) -> Tuple[Dict[str, Any], Tuple[AudienceSegment, ...], Dict[str, int]]:
+    """Parse the marketing strategy file once per process, with its derived segments"""
+    marketing_config = orjson.loads(Path(path_str).read_bytes())
+    segments, pain_point_bits = _build_audience_segments(marketing_config)
+    return marketing_config, segments, pain_point_bits
+
 class MarketingAutomation:
     def __init__(self, config: Dict[str, Any]):
         """Initialize marketing automation"""
         self.config = config
-        self.marketing_config = self._load_marketing_config()
+        self.marketing_config, self._segments, self._pain_point_bits = self._load_marketing_config()
+        paid_advertising = self.marketing_config.get("acquisition_channels", {}).get("paid_advertising", {})
+        self._ad_platforms = paid_advertising.get("platforms", paid_advertising)
+        self._setup_handlers = {
+            channel: functools.partial(self._setup_ads_campaign, channel)
+            for channel in AD_CHANNEL_SETTINGS
+        }
+        self._setup_handlers["email"] = self._setup_email_campaign
         self.email_automation = EmailSMSAutomation(config)
         self.analytics = AnalyticsReporting(config)
         
         # Initialize campaign tracking
-        self.campaign_tracking: Dict[str, Dict[str, Any]] = {}
+        self.campaign_tracking: Dict[str, Campaign] = {}
         
         logger.info("Marketing Automation initialized")
 
-    def _load_marketing_config(self) -> Dict[str, Any]:
-        """Load marketing strategy configuration"""
+    def _load_marketing_config(self) -> Tuple[Dict[str, Any], Tuple[AudienceSegment, ...], Dict[str, int]]:
+        """Load marketing strategy configuration and its audience segments"""
         try:
             template_path = Path(__file__).parent / "templates" / "marketing_strategy.json"
-            with open(template_path) as f:
-                return json.load(f)
+            return _load_marketing_config_cached(str(template_path))
         except Exception as e:
             logger.error(f"Error loading marketing config: {str(e)}")
-            capture_exception(e)
-            return {}
+            capture_exception_throttled(e)
+            return {}, (), {}
 
     async def identify_target_audience(self, user_data: Dict[str, Any]) -> Dict[str, Any]:
         """Identify target audience segment based on user data"""
         try:
-            audiences = self.marketing_config["target_audiences"]
             matched_segments = []
+            role = user_data.get("role", "").lower()
+            company_size = user_data.get("company_size")
+            user_mask = _pain_point_mask(user_data.get("pain_points", []), self._pain_point_bits)
             
             # Match user against audience personas
-            for segment, data in audiences.items():
-                persona = data["persona"]
-                match_score = 0
-                
-                # Check role match
-                if user_data.get("role", "").lower() in persona["role"].lower():
+            for segment, persona_role, persona_size, persona_mask, channels, topics in self._segments:
+                # Pain points overlap plus role match
+                match_score = (user_mask & persona_mask).bit_count()
+                if role in persona_role:
                     match_score += 3
                 
-                # Check company size match
-                if user_data.get("company_size") in persona["company_size"]:
+                # Company size adds at most 2; skip the substring search
+                # when the segment cannot reach the threshold anyway
+                if match_score + 2 < MIN_SEGMENT_SCORE:
+                    continue
+                if company_size and company_size in persona_size:
                     match_score += 2
                 
-                # Check pain points match
-                user_pain_points = set(user_data.get("pain_points", []))
-                persona_pain_points = set(persona["pain_points"])
-                pain_points_overlap = len(user_pain_points.intersection(persona_pain_points))
-                match_score += pain_points_overlap
-                
-                if match_score >= 3:
+                if match_score >= MIN_SEGMENT_SCORE:
                     matched_segments.append({
                         "segment": segment,
                         "score": match_score,
-                        "channels": data["channels"],
-                        "content_topics": data["content_topics"]
+                        "channels": channels,
+                        "content_topics": topics
                     })
             
             return {
@@ -75,7 +175,7 @@ class MarketingAutomation:
 
         except Exception as e:
             logger.error(f"Error identifying target audience: {str(e)}")
-            capture_exception(e)
+            capture_exception_throttled(e)
             return {
                 "success": False,
                 "error": str(e)
@@ -84,140 +184,94 @@ class MarketingAutomation:
     async def create_marketing_campaign(self, campaign_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create and launch marketing campaign"""
         try:
-            campaign_id = f"campaign_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+            campaign_id = f"campaign_{time.time_ns()}_{next(_campaign_counter)}"
             
             # Set up campaign tracking
-            self.campaign_tracking[campaign_id] = {
-                "status": "active",
-                "started_at": datetime.now().isoformat(),
-                "metrics": {
-                    "impressions": 0,
-                    "clicks": 0,
-                    "conversions": 0,
-                    "cost": 0
-                },
-                "channels": {}
-            }
+            campaign = Campaign(started_at=datetime.now().isoformat())
+            self.campaign_tracking[campaign_id] = campaign
+            
+            # Set up channel-specific campaigns concurrently
+            channels = [c for c in campaign_data["channels"] if c in self._setup_handlers]
+            results = await asyncio.gather(
+                *[self._setup_handlers[c](campaign_id, campaign_data) for c in channels],
+                return_exceptions=True
+            )
             
-            # Set up channel-specific campaigns
-            for channel in campaign_data["channels"]:
-                if channel == "google_ads":
-                    await self._setup_google_ads_campaign(campaign_id, campaign_data)
-                elif channel == "facebook_ads":
-                    await self._setup_facebook_ads_campaign(campaign_id, campaign_data)
-                elif channel == "linkedin_ads":
-                    await self._setup_linkedin_ads_campaign(campaign_id, campaign_data)
-                elif channel == "email":
-                    await self._setup_email_campaign(campaign_id, campaign_data)
+            # A failed channel must not abort the others
+            for channel, result in zip(channels, results):
+                if isinstance(result, Exception):
+                    logger.error(f"Error setting up {channel} campaign: {str(result)}")
+                    capture_exception_throttled(result)
+                    campaign.failed_channels[channel] = str(result)
             
             return {
                 "success": True,
                 "campaign_id": campaign_id,
-                "status": "active",
-                "channels": list(self.campaign_tracking[campaign_id]["channels"].keys())
+                "status": campaign.status,
+                "channels": list(campaign.channels.keys()),
+                "failed_channels": dict(campaign.failed_channels)
             }
 
         except Exception as e:
             logger.error(f"Error creating marketing campaign: {str(e)}")
-            capture_exception(e)
+            capture_exception_throttled(e)
             return {
                 "success": False,
                 "error": str(e)
             }
 
-    async def _setup_google_ads_campaign(self, campaign_id: str, campaign_data: Dict[str, Any]) -> None:
-        """Set up Google Ads campaign"""
-        config = self.marketing_config["acquisition_channels"]["paid_advertising"]["google_ads"]
+    async def _setup_ads_campaign(self, channel: str, campaign_id: str, campaign_data: Dict[str, Any]) -> None:
+        """Set up a paid advertising campaign from the channel's settings template"""
+        config = self._ad_platforms[channel]
         
-        self.campaign_tracking[campaign_id]["channels"]["google_ads"] = {
-            "status": "active",
-            "campaign_types": campaign_data.get("campaign_types", config["campaign_types"]),
-            "keywords": campaign_data.get("keywords", config["target_keywords"]),
-            "metrics": {
-                "impressions": 0,
-                "clicks": 0,
-                "conversions": 0,
-                "cost": 0
+        self.campaign_tracking[campaign_id].channels[channel] = ChannelState(
+            metrics=CampaignMetrics(),
+            settings={
+                setting: campaign_data.get(setting, config[config_key])
+                for setting, config_key in AD_CHANNEL_SETTINGS[channel]
             }
-        }
-
-    async def _setup_facebook_ads_campaign(self, campaign_id: str, campaign_data: Dict[str, Any]) -> None:
-        """Set up Facebook Ads campaign"""
-        config = self.marketing_config["acquisition_channels"]["paid_advertising"]["facebook_ads"]
-        
-        self.campaign_tracking[campaign_id]["channels"]["facebook_ads"] = {
-            "status": "active",
-            "campaign_types": campaign_data.get("campaign_types", config["campaign_types"]),
-            "targeting": campaign_data.get("targeting", config["targeting"]),
-            "metrics": {
-                "impressions": 0,
-                "clicks": 0,
-                "conversions": 0,
-                "cost": 0
-            }
-        }
-
-    async def _setup_linkedin_ads_campaign(self, campaign_id: str, campaign_data: Dict[str, Any]) -> None:
-        """Set up LinkedIn Ads campaign"""
-        config = self.marketing_config["acquisition_channels"]["paid_advertising"]["linkedin_ads"]
-        
-        self.campaign_tracking[campaign_id]["channels"]["linkedin_ads"] = {
-            "status": "active",
-            "campaign_types": campaign_data.get("campaign_types", config["campaign_types"]),
-            "targeting": campaign_data.get("targeting", config["targeting"]),
-            "metrics": {
-                "impressions": 0,
-                "clicks": 0,
-                "conversions": 0,
-                "cost": 0
-            }
-        }
+        )
 
     async def _setup_email_campaign(self, campaign_id: str, campaign_data: Dict[str, Any]) -> None:
         """Set up email marketing campaign"""
-        self.campaign_tracking[campaign_id]["channels"]["email"] = {
-            "status": "active",
-            "sequence": campaign_data.get("email_sequence", []),
-            "metrics": {
-                "sent": 0,
-                "opened": 0,
-                "clicked": 0,
-                "converted": 0
-            }
-        }
+        self.campaign_tracking[campaign_id].channels["email"] = ChannelState(
+            metrics=EmailMetrics(),
+            settings={"sequence": campaign_data.get("email_sequence", [])}
+        )
 
     async def track_campaign_metrics(self, campaign_id: str, channel: str,
                                   metrics: Dict[str, Any]) -> Dict[str, Any]:
         """Track campaign metrics"""
         try:
-            if campaign_id not in self.campaign_tracking:
+            campaign = self.campaign_tracking.get(campaign_id)
+            if campaign is None:
                 raise ValueError(f"Invalid campaign ID: {campaign_id}")
             
-            if channel not in self.campaign_tracking[campaign_id]["channels"]:
+            channel_state = campaign.channels.get(channel)
+            if channel_state is None:
                 raise ValueError(f"Invalid channel for campaign: {channel}")
             
-            # Update channel metrics
-            channel_metrics = self.campaign_tracking[campaign_id]["channels"][channel]["metrics"]
-            for metric, value in metrics.items():
-                if metric in channel_metrics:
-                    channel_metrics[metric] += value
-            
-            # Update overall campaign metrics
-            campaign_metrics = self.campaign_tracking[campaign_id]["metrics"]
+            # Update channel and overall campaign metrics in one pass
+            channel_metrics = channel_state.metrics
+            campaign_metrics = campaign.metrics
+            channel_fields = channel_metrics.__slots__
+            campaign_fields = campaign_metrics.__slots__
             for metric, value in metrics.items():
-                if metric in campaign_metrics:
-                    campaign_metrics[metric] += value
+                if metric in channel_fields:
+                    setattr(channel_metrics, metric, getattr(channel_metrics, metric) + value)
+                if metric in campaign_fields:
+                    setattr(campaign_metrics, metric, getattr(campaign_metrics, metric) + value)
             
             return {
                 "success": True,
                 "campaign_id": campaign_id,
                 "channel": channel,
-                "updated_metrics": channel_metrics
+                "updated_metrics": asdict(channel_metrics)
             }
 
         except Exception as e:
             logger.error(f"Error tracking campaign metrics: {str(e)}")
-            capture_exception(e)
+            capture_exception_throttled(e)
             return {
                 "success": False,
                 "error": str(e)
@@ -232,26 +286,27 @@ class MarketingAutomation:
             campaign = self.campaign_tracking[campaign_id]
             
             # Calculate ROI and other derived metrics
-            total_cost = campaign["metrics"]["cost"]
-            total_conversions = campaign["metrics"]["conversions"]
+            metrics = campaign.metrics
+            total_cost = metrics.cost
+            total_conversions = metrics.conversions
             
             performance = {
                 "campaign_id": campaign_id,
-                "status": campaign["status"],
+                "status": campaign.status,
                 "duration": {
-                    "start": campaign["started_at"],
+                    "start": campaign.started_at,
                     "end": datetime.now().isoformat()
                 },
-                "overall_metrics": campaign["metrics"],
+                "overall_metrics": asdict(metrics),
                 "channel_metrics": {
-                    channel: data["metrics"]
-                    for channel, data in campaign["channels"].items()
+                    channel: asdict(state.metrics)
+                    for channel, state in campaign.channels.items()
                 },
                 "derived_metrics": {
-                    "cpc": total_cost / campaign["metrics"]["clicks"] if campaign["metrics"]["clicks"] > 0 else 0,
+                    "cpc": total_cost / metrics.clicks if metrics.clicks > 0 else 0,
                     "cpa": total_cost / total_conversions if total_conversions > 0 else 0,
-                    "conversion_rate": (total_conversions / campaign["metrics"]["clicks"] * 100)
-                    if campaign["metrics"]["clicks"] > 0 else 0
+                    "conversion_rate": (total_conversions / metrics.clicks * 100)
+                    if metrics.clicks > 0 else 0
                 }
             }
             
@@ -262,7 +317,7 @@ class MarketingAutomation:
 
         except Exception as e:
             logger.error(f"Error getting campaign performance: {str(e)}")
-            capture_exception(e)
+            capture_exception_throttled(e)
             return {
                 "success": False,
                 "error": str(e)
@@ -318,7 +373,7 @@ class MarketingAutomation:
 
         except Exception as e:
             logger.error(f"Error optimizing campaign: {str(e)}")
-            capture_exception(e)
+            capture_exception_throttled(e)
             return {
                 "success": False,
                 "error": str(e)
@@ -328,7 +383,7 @@ class MarketingAutomation:
         """Refine campaign targeting"""
         campaign = self.campaign_tracking[campaign_id]
         
-        for channel, data in campaign["channels"].items():
+        for channel, state in campaign.channels.items():
             if channel == "google_ads":
                 # Optimize keywords based on performance
                 pass
@@ -345,12 +400,12 @@ class MarketingAutomation:
         
         # Calculate channel performance
         channel_performance = {}
-        for channel, data in campaign["channels"].items():
-            metrics = data["metrics"]
-            if metrics["cost"] > 0:
+        for channel, state in campaign.channels.items():
+            metrics = state.metrics
+            if isinstance(metrics, CampaignMetrics) and metrics.cost > 0:
                 channel_performance[channel] = {
-                    "roas": metrics["conversions"] * 100 / metrics["cost"],  # Assuming $100 value per conversion
-                    "current_budget": metrics["cost"]
+                    "roas": metrics.conversions * 100 / metrics.cost,  # Assuming $100 value per conversion
+                    "current_budget": metrics.cost
                 }
         
         # Reallocate budget based on ROAS
@@ -1,13 +1,68 @@
+import asyncio
+import hashlib
 import logging
-from typing import Dict, Any, Optional
+import mmap
+import time
+from collections import defaultdict, deque
+from itertools import islice
+from pathlib import Path
+from typing import Deque, Dict, Any, Iterable, List, Optional
+import aiofiles
+import orjson
 import stripe
 import paypalrestsdk
-from datetime import datetime
-import json
-from sentry_config import capture_exception
+from datetime import datetime, timezone
+from .error_reporting import capture_exception_throttled
 
 logger = logging.getLogger(__name__)
 
+# Payment statuses that can no longer change on the gateway side
+TERMINAL_STATUSES = frozenset({"succeeded", "canceled", "failed", "refunded"})
+
+DEFAULT_HISTORY_LIMIT = 10_000
+
+# Fields kept for the recent payments shown in analytics
+RECENT_PAYMENT_FIELDS = ("payment_id", "gateway", "amount", "currency", "status", "timestamp_ns")
+
+
+def _to_cents(amount: Any) -> int:
+    """Convert a major-unit amount (e.g. 19.99) to integer minor units"""
+    return int(round(float(amount) * 100))
+
+
+def _idempotency_key(payment_data: Dict[str, Any]) -> Optional[str]:
+    """Return the caller's idempotency key, or derive one from the order and its payment details.
+
+    Deriving from the full request means a retry of the same order with a
+    different card or amount is a new request, not a replay of the earlier
+    (possibly declined) one.
+    """
+    if payment_data.get("idempotency_key"):
+        return payment_data["idempotency_key"]
+    order_id = payment_data.get("order_id")
+    if not order_id:
+        return None
+    request = orjson.dumps([
+        order_id,
+        _to_cents(payment_data["amount"]),
+        payment_data.get("currency", "usd").lower(),
+        payment_data["payment_method"]
+    ])
+    return f"payment_{order_id}_{hashlib.blake2b(request, digest_size=16).hexdigest()}"
+
+
+def _tail(items: Iterable[Any], limit: int) -> List[Any]:
+    """Return the last `limit` items of a list or deque without slicing it"""
+    return list(islice(reversed(items), limit))[::-1]
+
+def _spill_path(payment_config: Dict[str, Any], key: str, filename: str) -> Path:
+    """Resolve a history spill file from its own setting or the gateway's data_dir"""
+    if key in payment_config:
+        return Path(payment_config[key])
+    if "data_dir" not in payment_config:
+        raise ValueError(f"Payment gateway config needs data_dir or {key}")
+    return Path(payment_config["data_dir"]) / filename
+
 class PaymentGateway:
     def __init__(self, config: Dict[str, Any]):
         """Initialize payment gateway with configuration"""
@@ -28,8 +83,41 @@ class PaymentGateway:
             })
             self.paypal_client = paypalrestsdk
             
-        # Initialize payment history
-        self.payment_history: List[Dict[str, Any]] = []
+        # Initialize payment history as a ring buffer; evicted payments are
+        # appended to a JSON-lines spill file by a background writer
+        self.payment_history: Deque[Dict[str, Any]] = deque(
+            maxlen=self.payment_config.get("history_limit", DEFAULT_HISTORY_LIMIT)
+        )
+        self._spill_path = _spill_path(self.payment_config, "history_spill_path", "payments.jsonl")
+        self._spill_queue: asyncio.Queue = asyncio.Queue()
+        self._spill_task: Optional[asyncio.Task] = None
+        
+        # Lookup indexes hold sequence numbers; payment_history[0] has
+        # sequence number _history_offset
+        self._history_offset = 0
+        self._payments_by_id: Dict[str, Dict[str, Any]] = {}
+        self._by_customer: Dict[str, Deque[int]] = defaultdict(deque)
+        self._by_gateway: Dict[str, Deque[int]] = {"stripe": deque(), "paypal": deque()}
+        self._overall_totals: Dict[str, int] = {"count": 0, "amount_cents": 0}
+        self._totals: Dict[str, Dict[str, int]] = {
+            "stripe": {"count": 0, "amount_cents": 0},
+            "paypal": {"count": 0, "amount_cents": 0}
+        }
+        self._recent: Deque[Dict[str, Any]] = deque(maxlen=5)
+        
+        # Per-gateway handlers
+        self._processors = {
+            "stripe": self._process_stripe_payment,
+            "paypal": self._process_paypal_payment
+        }
+        self._status_fns = {
+            "stripe": self._get_stripe_payment_status,
+            "paypal": self._get_paypal_payment_status
+        }
+        self._refund_fns = {
+            "stripe": self._refund_stripe_payment,
+            "paypal": self._refund_paypal_payment
+        }
         
         logger.info("Payment Gateway initialized successfully")
 
@@ -38,27 +126,36 @@ class PaymentGateway:
         try:
             gateway = payment_data.get("gateway", "stripe").lower()
             
-            if gateway == "stripe":
-                return await self._process_stripe_payment(payment_data)
-            elif gateway == "paypal":
-                return await self._process_paypal_payment(payment_data)
-            else:
+            processor = self._processors.get(gateway)
+            if processor is None:
                 raise ValueError(f"Unsupported payment gateway: {gateway}")
+            return await processor(payment_data)
                 
         except Exception as e:
             logger.error(f"Error processing payment: {str(e)}")
-            capture_exception(e)
+            capture_exception_throttled(e)
             return {
                 "success": False,
                 "error": str(e)
             }
 
+    async def process_payments_bulk(self, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Process a batch of payments concurrently, preserving input order"""
+        return await asyncio.gather(*(self.process_payment(p) for p in batch))
+
     async def _process_stripe_payment(self, payment_data: Dict[str, Any]) -> Dict[str, Any]:
         """Process payment through Stripe"""
         try:
-            # Create payment intent
-            intent = stripe.PaymentIntent.create(
-                amount=int(float(payment_data["amount"]) * 100),  # Convert to cents
+            # Keying on the order and its payment details makes retries of a
+            # bulk run safe without blocking a retry with another card
+            order_id = payment_data.get("order_id")
+            idempotency_key = _idempotency_key(payment_data)
+            request_options = {"idempotency_key": idempotency_key} if idempotency_key else {}
+            
+            # Create payment intent off the event loop; the SDK is blocking
+            intent = await asyncio.to_thread(
+                stripe.PaymentIntent.create,
+                amount=_to_cents(payment_data["amount"]),
                 currency=payment_data.get("currency", "usd"),
                 payment_method=payment_data["payment_method"],
                 confirmation_method="manual",
@@ -66,8 +163,9 @@ class PaymentGateway:
                 return_url=payment_data.get("return_url"),
                 metadata={
                     "customer_id": payment_data.get("customer_id"),
-                    "order_id": payment_data.get("order_id")
-                }
+                    "order_id": order_id
+                },
+                **request_options
             )
             
             # Record payment
@@ -90,7 +188,7 @@ class PaymentGateway:
             
         except stripe.error.StripeError as e:
             logger.error(f"Stripe error: {str(e)}")
-            capture_exception(e)
+            capture_exception_throttled(e)
             return {
                 "success": False,
                 "error": str(e)
@@ -118,7 +216,7 @@ class PaymentGateway:
                 }
             })
             
-            if payment.create():
+            if await asyncio.to_thread(payment.create):
                 # Record payment
                 self._record_payment({
                     "gateway": "paypal",
@@ -144,137 +242,303 @@ class PaymentGateway:
                 
         except Exception as e:
             logger.error(f"PayPal error: {str(e)}")
-            capture_exception(e)
+            capture_exception_throttled(e)
             return {
                 "success": False,
                 "error": str(e)
             }
 
     def _record_payment(self, payment_details: Dict[str, Any]) -> None:
-        """Record payment in history"""
-        self.payment_history.append({
+        """Record payment in history and update indexes and running totals"""
+        if len(self.payment_history) == self.payment_history.maxlen:
+            self._evict_oldest_payment()
+        
+        position = self._history_offset + len(self.payment_history)
+        amount_cents = _to_cents(payment_details["amount"])
+        entry = {
             **payment_details,
-            "timestamp": datetime.now().isoformat()
-        })
+            "amount_cents": amount_cents,
+            "timestamp_ns": time.time_ns()
+        }
+        self.payment_history.append(entry)
+        self._payments_by_id[payment_details["payment_id"]] = entry
+        self._recent.append({field: entry.get(field) for field in RECENT_PAYMENT_FIELDS})
+        
+        gateway = payment_details["gateway"]
+        customer_id = payment_details.get("customer_id")
+        if customer_id:
+            self._by_customer[customer_id].append(position)
+        self._by_gateway.setdefault(gateway, deque()).append(position)
+        
+        self._overall_totals["count"] += 1
+        self._overall_totals["amount_cents"] += amount_cents
+        totals = self._totals.setdefault(gateway, {"count": 0, "amount_cents": 0})
+        totals["count"] += 1
+        totals["amount_cents"] += amount_cents
+
+    def _evict_oldest_payment(self) -> None:
+        """Drop the oldest payment from memory and hand it to the spill writer"""
+        oldest = self.payment_history.popleft()
+        self._history_offset += 1
+        
+        # The oldest payment is also the oldest entry in each of its indexes
+        customer_id = oldest.get("customer_id")
+        if customer_id:
+            positions = self._by_customer[customer_id]
+            positions.popleft()
+            if not positions:
+                del self._by_customer[customer_id]
+        self._by_gateway[oldest["gateway"]].popleft()
+        if self._payments_by_id.get(oldest["payment_id"]) is oldest:
+            del self._payments_by_id[oldest["payment_id"]]
+        
+        self._spill_queue.put_nowait(oldest)
+        try:
+            if self._spill_task is None or self._spill_task.done():
+                self._spill_task = asyncio.get_running_loop().create_task(self._spill_writer())
+        except RuntimeError:
+            # No running event loop; write the backlog synchronously instead
+            self._spill_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self._spill_path, "ab") as f:
+                while not self._spill_queue.empty():
+                    f.write(orjson.dumps(self._spill_queue.get_nowait()) + b"\n")
+                    self._spill_queue.task_done()
+
+    async def _spill_writer(self) -> None:
+        """Append evicted payments to the spill file as JSON lines"""
+        try:
+            self._spill_path.parent.mkdir(parents=True, exist_ok=True)
+            async with aiofiles.open(self._spill_path, "ab") as f:
+                while True:
+                    batch = [await self._spill_queue.get()]
+                    while not self._spill_queue.empty():
+                        batch.append(self._spill_queue.get_nowait())
+                    try:
+                        await f.write(b"".join(orjson.dumps(p) + b"\n" for p in batch))
+                        await f.flush()
+                    finally:
+                        for _ in batch:
+                            self._spill_queue.task_done()
+                            
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error spilling payment history: {str(e)}")
+            capture_exception_throttled(e)
+
+    def _read_spilled_payments(self, customer_id: Optional[str], gateway: Optional[str],
+                               limit: Optional[int]) -> List[Dict[str, Any]]:
+        """Read the newest matching spilled payments, scanning the file backwards"""
+        if not self._spill_path.exists() or self._spill_path.stat().st_size == 0:
+            return []
+        
+        matches = []
+        with open(self._spill_path, "rb") as f, \
+             mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            end = len(mm)
+            while end > 0 and (not limit or len(matches) < limit):
+                start = mm.rfind(b"\n", 0, end - 1) + 1
+                line = mm[start:end].strip()
+                end = start
+                if not line:
+                    continue
+                try:
+                    payment = orjson.loads(line)
+                except orjson.JSONDecodeError:
+                    continue  # Partially written line
+                if customer_id and payment.get("customer_id") != customer_id:
+                    continue
+                if gateway and payment["gateway"] != gateway:
+                    continue
+                matches.append(payment)
+        
+        matches.reverse()
+        return matches
+
+    @staticmethod
+    def _fmt_ts(timestamp_ns: int) -> str:
+        """Format a nanosecond epoch timestamp as an ISO 8601 string"""
+        return datetime.fromtimestamp(timestamp_ns / 1e9, tz=timezone.utc).isoformat()
+
+    def _format_payment(self, payment: Dict[str, Any]) -> Dict[str, Any]:
+        """Add the formatted timestamp to a payment record for output"""
+        return {**payment, "timestamp": self._fmt_ts(payment["timestamp_ns"])}
 
     async def get_payment_status(self, payment_id: str, gateway: str) -> Dict[str, Any]:
         """Get status of a payment"""
         try:
-            if gateway == "stripe":
-                payment = stripe.PaymentIntent.retrieve(payment_id)
-                return {
-                    "success": True,
-                    "status": payment.status,
-                    "amount": payment.amount / 100,  # Convert from cents
-                    "currency": payment.currency,
-                    "metadata": payment.metadata
-                }
-            elif gateway == "paypal":
-                payment = self.paypal_client.Payment.find(payment_id)
+            # Terminal payments recorded locally need no gateway round-trip
+            recorded = self._payments_by_id.get(payment_id)
+            if recorded and recorded["gateway"] == gateway and recorded["status"] in TERMINAL_STATUSES:
                 return {
                     "success": True,
-                    "status": payment.state,
-                    "amount": payment.transactions[0].amount.total,
-                    "currency": payment.transactions[0].amount.currency
+                    "status": recorded["status"],
+                    "amount": recorded["amount_cents"] / 100,
+                    "currency": recorded["currency"],
+                    "metadata": {
+                        "customer_id": recorded.get("customer_id"),
+                        "order_id": recorded.get("order_id")
+                    }
                 }
-            else:
+            
+            status_fn = self._status_fns.get(gateway)
+            if status_fn is None:
                 raise ValueError(f"Unsupported payment gateway: {gateway}")
+            return await status_fn(payment_id)
                 
         except Exception as e:
             logger.error(f"Error getting payment status: {str(e)}")
-            capture_exception(e)
+            capture_exception_throttled(e)
             return {
                 "success": False,
                 "error": str(e)
             }
 
+    async def _get_stripe_payment_status(self, payment_id: str) -> Dict[str, Any]:
+        """Get status of a Stripe payment"""
+        payment = await asyncio.to_thread(stripe.PaymentIntent.retrieve, payment_id)
+        return {
+            "success": True,
+            "status": payment.status,
+            "amount": payment.amount / 100,  # Convert from cents
+            "currency": payment.currency,
+            "metadata": payment.metadata
+        }
+
+    async def _get_paypal_payment_status(self, payment_id: str) -> Dict[str, Any]:
+        """Get status of a PayPal payment"""
+        payment = await asyncio.to_thread(self.paypal_client.Payment.find, payment_id)
+        return {
+            "success": True,
+            "status": payment.state,
+            "amount": payment.transactions[0].amount.total,
+            "currency": payment.transactions[0].amount.currency
+        }
+
     async def refund_payment(self, payment_id: str, gateway: str, amount: Optional[float] = None) -> Dict[str, Any]:
         """Refund a payment"""
         try:
-            if gateway == "stripe":
-                refund = stripe.Refund.create(
-                    payment_intent=payment_id,
-                    amount=int(amount * 100) if amount else None
-                )
-                return {
-                    "success": True,
-                    "refund_id": refund.id,
-                    "status": refund.status,
-                    "amount": refund.amount / 100
-                }
-            elif gateway == "paypal":
-                payment = self.paypal_client.Payment.find(payment_id)
-                sale_id = payment.transactions[0].related_resources[0].sale.id
-                sale = self.paypal_client.Sale.find(sale_id)
-                refund = sale.refund({
-                    "amount": {
-                        "total": str(amount) if amount else payment.transactions[0].amount.total,
-                        "currency": payment.transactions[0].amount.currency
-                    }
-                })
-                return {
-                    "success": True,
-                    "refund_id": refund.id,
-                    "status": refund.state,
-                    "amount": float(refund.amount.total)
-                }
-            else:
+            refund_fn = self._refund_fns.get(gateway)
+            if refund_fn is None:
                 raise ValueError(f"Unsupported payment gateway: {gateway}")
+            result = await refund_fn(payment_id, amount)
+            self._mark_refunded(payment_id, amount)
+            return result
                 
         except Exception as e:
             logger.error(f"Error refunding payment: {str(e)}")
-            capture_exception(e)
+            capture_exception_throttled(e)
             return {
                 "success": False,
                 "error": str(e)
             }
 
+    async def _refund_stripe_payment(self, payment_id: str, amount: Optional[float]) -> Dict[str, Any]:
+        """Refund a Stripe payment"""
+        refund = await asyncio.to_thread(
+            stripe.Refund.create,
+            payment_intent=payment_id,
+            amount=_to_cents(amount) if amount else None
+        )
+        return {
+            "success": True,
+            "refund_id": refund.id,
+            "status": refund.status,
+            "amount": refund.amount / 100
+        }
+
+    async def _refund_paypal_payment(self, payment_id: str, amount: Optional[float]) -> Dict[str, Any]:
+        """Refund a PayPal payment"""
+        payment = await asyncio.to_thread(self.paypal_client.Payment.find, payment_id)
+        sale_id = payment.transactions[0].related_resources[0].sale.id
+        sale = await asyncio.to_thread(self.paypal_client.Sale.find, sale_id)
+        refund = await asyncio.to_thread(sale.refund, {
+            "amount": {
+                "total": str(amount) if amount else payment.transactions[0].amount.total,
+                "currency": payment.transactions[0].amount.currency
+            }
+        })
+        return {
+            "success": True,
+            "refund_id": refund.id,
+            "status": refund.state,
+            "amount": float(refund.amount.total)
+        }
+
+    def _mark_refunded(self, payment_id: str, amount: Optional[float]) -> None:
+        """Mark a recorded payment as refunded after a full refund"""
+        recorded = self._payments_by_id.get(payment_id)
+        if recorded and (amount is None or _to_cents(amount) >= recorded["amount_cents"]):
+            recorded["status"] = "refunded"
+
     async def get_payment_history(self, customer_id: Optional[str] = None,
                                 gateway: Optional[str] = None,
                                 limit: Optional[int] = None) -> List[Dict[str, Any]]:
         """Get payment history with optional filtering"""
         try:
             history = self.payment_history
+            offset = self._history_offset
             
             if customer_id:
-                history = [p for p in history if p.get("customer_id") == customer_id]
-                
-            if gateway:
-                history = [p for p in history if p["gateway"] == gateway]
-                
-            if limit:
-                history = history[-limit:]
+                positions = self._by_customer.get(customer_id, ())
+                if gateway:
+                    positions = [i for i in positions if history[i - offset]["gateway"] == gateway]
+                payments = [history[i - offset] for i in (_tail(positions, limit) if limit else positions)]
+            elif gateway:
+                positions = self._by_gateway.get(gateway, ())
+                payments = [history[i - offset] for i in (_tail(positions, limit) if limit else positions)]
+            else:
+                payments = _tail(history, limit) if limit else list(history)
+            
+            # Fall back to the spill file when memory cannot satisfy the request
+            if offset and (not limit or len(payments) < limit):
+                older = await asyncio.to_thread(
+                    self._read_spilled_payments, customer_id, gateway,
+                    limit - len(payments) if limit else None
+                )
+                payments = older + payments
                 
-            return history
+            return [self._format_payment(p) for p in payments]
             
         except Exception as e:
             logger.error(f"Error getting payment history: {str(e)}")
-            capture_exception(e)
+            capture_exception_throttled(e)
             return []
 
+    async def __aenter__(self) -> "PaymentGateway":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.shutdown()
+
+    async def shutdown(self) -> None:
+        """Flush spilled payment history and stop the background writer"""
+        try:
+            if self._spill_task and not self._spill_task.done():
+                await self._spill_queue.join()
+                self._spill_task.cancel()
+                
+        except Exception as e:
+            logger.error(f"Error during payment gateway shutdown: {str(e)}")
+            capture_exception_throttled(e)
+
     async def get_analytics(self) -> Dict[str, Any]:
         """Get payment analytics"""
         try:
-            stripe_payments = [p for p in self.payment_history if p["gateway"] == "stripe"]
-            paypal_payments = [p for p in self.payment_history if p["gateway"] == "paypal"]
-            
             return {
-                "total_payments": len(self.payment_history),
-                "total_amount": sum(float(p["amount"]) for p in self.payment_history),
+                "total_payments": self._overall_totals["count"],
+                "total_amount": self._overall_totals["amount_cents"] / 100,
                 "by_gateway": {
-                    "stripe": {
-                        "count": len(stripe_payments),
-                        "amount": sum(float(p["amount"]) for p in stripe_payments)
-                    },
-                    "paypal": {
-                        "count": len(paypal_payments),
-                        "amount": sum(float(p["amount"]) for p in paypal_payments)
+                    gateway: {
+                        "count": totals["count"],
+                        "amount": totals["amount_cents"] / 100
                     }
+                    for gateway, totals in self._totals.items()
                 },
-                "recent_payments": self.payment_history[-5:]  # Last 5 payments
+                "recent_payments": [self._format_payment(p) for p in self._recent]  # Last 5 payments
             }
             
         except Exception as e:
             logger.error(f"Error getting payment analytics: {str(e)}")
-            capture_exception(e)
+            capture_exception_throttled(e)
             return {}
@@ -1,23 +1,157 @@
 import logging
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 import aiohttp
 import asyncio
+import functools
+import math
+import time
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-import json
 from decimal import Decimal
+import numpy as np
+import orjson
 from pathlib import Path
 from sentry_config import capture_exception
 
 logger = logging.getLogger(__name__)
 
+# Multipliers for bulk-discount threshold labels such as "1M+" or "100GB+"
+THRESHOLD_UNITS = {"k": 1_000, "M": 1_000_000, "GB": 1, "TB": 1_000}
+
+# Prices are held as integer micro-units (millionths of a currency unit) so
+# cost arithmetic stays in native ints; convert back only at the output boundary
+MICROS = 1_000_000
+
+# A base price plus its bulk-discount tiers as (threshold, price), highest threshold first
+TierTable = Tuple[int, List[Tuple[int, int]]]
+
+
+def _parse_threshold(label: str) -> int:
+    """Parse a bulk-discount threshold label like "100k+" into a number"""
+    value = label.rstrip("+")
+    for suffix, multiplier in THRESHOLD_UNITS.items():
+        if value.endswith(suffix):
+            return int(value[:-len(suffix)]) * multiplier
+    return int(value)
+
+
+def _build_tier_table(base_price: Any, bulk_discounts: Dict[str, Any]) -> TierTable:
+    """Flatten a base price and its bulk discounts into a sorted tier table"""
+    tiers = sorted(
+        ((_parse_threshold(label), _to_micros(price)) for label, price in bulk_discounts.items()),
+        reverse=True
+    )
+    return _to_micros(base_price), tiers
+
+
+def _to_decimal(value: Any) -> Decimal:
+    """Convert a number to Decimal, parsing through str only for floats"""
+    if isinstance(value, (int, Decimal)):
+        return Decimal(value)
+    return Decimal(str(value))
+
+
+def _to_micros(value: Any) -> int:
+    """Convert a currency amount or price to integer micro-units"""
+    return int((_to_decimal(value) * MICROS).to_integral_value())
+
+
+def _format_ns(timestamp_ns: int) -> str:
+    """Format a nanosecond epoch timestamp as a local ISO 8601 string"""
+    return datetime.fromtimestamp(timestamp_ns / 1e9).isoformat()
+
+
+def _select_tier(usage: Any, table: TierTable) -> int:
+    """Return the price of the highest tier whose threshold the usage reaches"""
+    base_price, tiers = table
+    for threshold, price in tiers:
+        if usage >= threshold:
+            return price
+    return base_price
+
+
+@dataclass(slots=True)
+class UsageRecord:
+    """Resource usage counters for one user"""
+    ai_tokens: int = 0
+    storage: float = 0
+    api_calls: int = 0
+    messages: int = 0
+    last_updated_ns: int = 0
+
+
+# Usage types that track_usage accepts
+USAGE_TYPES = frozenset({"ai_tokens", "storage", "api_calls", "messages"})
+
+# Units each metered resource is priced per: 1k tokens, 1 GB, 1k API calls
+METERED_DIVISORS = {"ai_tokens": 1000, "storage": 1, "api_calls": 1000}
+
+# Usage counters checked against plan limits, as (usage type, limit key)
+LIMIT_CHECKS = (("messages", "monthly_messages"), ("storage", "storage_gb"))
+
+
+def _compile_limits(plan_limits: Dict[str, Any]) -> List[Tuple[str, Optional[float]]]:
+    """Coerce plan limits to numbers: "unlimited" becomes inf and "custom" becomes None"""
+    compiled = []
+    for usage_type, limit_key in LIMIT_CHECKS:
+        limit = plan_limits.get(limit_key, "unlimited")
+        if limit == "unlimited":
+            limit = math.inf
+        elif limit == "custom":
+            limit = None
+        compiled.append((usage_type, limit))
+    return compiled
+
+
+def _compute_metered(usage: Any, table: TierTable, divisor: int = 1) -> Tuple[int, int]:
+    """Return the tier price and cost, both in micro-units, for a metered usage figure"""
+    price = _select_tier(usage, table)
+    if isinstance(usage, int):
+        return price, usage * price // divisor
+    return price, round(usage * price / divisor)
+
+
+def _tier_arrays(table: TierTable) -> Tuple[np.ndarray, np.ndarray]:
+    """Convert a tier table to ascending float thresholds and matching prices.
+
+    prices[0] is the base price and prices[i] applies once usage reaches
+    thresholds[i - 1], so np.searchsorted(..., side="right") indexes prices.
+    """
+    base_price, tiers = table
+    ascending = tiers[::-1]
+    thresholds = np.array([threshold for threshold, _ in ascending], dtype=np.float64)
+    prices = np.array([base_price] + [price for _, price in ascending], dtype=np.float64) / MICROS
+    return thresholds, prices
+
+
+def _tiered_costs(usage: np.ndarray, arrays: Tuple[np.ndarray, np.ndarray], divisor: int = 1) -> np.ndarray:
+    """Price a column of usage values against a tier table in one vectorized pass"""
+    thresholds, prices = arrays
+    return usage / divisor * prices[np.searchsorted(thresholds, usage, side="right")]
+
+
 class PricingManager:
     def __init__(self, config: Dict[str, Any]):
         """Initialize pricing manager"""
         self.config = config
         self.pricing_config = self._load_pricing_config()
+        self._plans: Dict[str, Any] = self.pricing_config.get("subscription_plans", {})
+        self._offers: Dict[str, Any] = self.pricing_config.get("promotional_offers", {})
+        self._annual_factor = 1 - self._offers.get("annual_discount", {}).get("percentage", 0) / 100
+        self._price_for = functools.lru_cache(maxsize=64)(self._compute_price)
+        self._plan_limits = {
+            plan_id: _compile_limits(plan.get("limits", {})) for plan_id, plan in self._plans.items()
+        }
+        self._bulk_tables = self._build_bulk_tables()
+        self._fee_table = self._build_fee_table()
+        self._batch_tables = {
+            "ai_tokens": {model: _tier_arrays(table) for model, table in self._bulk_tables["ai_tokens"].items()},
+            **{resource: _tier_arrays(self._bulk_tables[resource])
+               for resource in ("storage", "api_calls") if resource in self._bulk_tables}
+        }
         
         # Initialize usage tracking
-        self.usage_tracking: Dict[str, Dict[str, Any]] = {}
+        self.usage_tracking: Dict[str, UsageRecord] = {}
         
         logger.info("Pricing Manager initialized")
 
@@ -25,36 +159,68 @@ class PricingManager:
         """Load pricing configuration"""
         try:
             template_path = Path(__file__).parent / "templates" / "pricing_model.json"
-            with open(template_path) as f:
-                return json.load(f)
+            return orjson.loads(template_path.read_bytes())
         except Exception as e:
             logger.error(f"Error loading pricing config: {str(e)}")
             capture_exception(e)
             return {}
 
-    async def calculate_subscription_price(self, plan_id: str, billing_cycle: str = "monthly") -> Dict[str, Any]:
+    def _build_bulk_tables(self) -> Dict[str, Any]:
+        """Denormalize usage-based pricing into per-resource tier tables"""
+        usage_pricing = self.pricing_config.get("usage_based_pricing", {})
+        tables: Dict[str, Any] = {
+            "ai_tokens": {
+                model: _build_tier_table(pricing["price_per_1k"], pricing["bulk_discounts"])
+                for model, pricing in usage_pricing.get("ai_tokens", {}).items()
+            }
+        }
+        if "storage" in usage_pricing:
+            pricing = usage_pricing["storage"]
+            tables["storage"] = _build_tier_table(pricing["price_per_gb"], pricing["bulk_discounts"])
+        if "api_calls" in usage_pricing:
+            pricing = usage_pricing["api_calls"]
+            tables["api_calls"] = _build_tier_table(pricing["price_per_1k"], pricing["bulk_discounts"])
+        return tables
+
+    def _build_fee_table(self) -> Dict[Tuple[str, str], Tuple[Decimal, Decimal]]:
+        """Flatten payment processing fees into (percentage / 100, fixed) per method and provider"""
+        return {
+            (payment_method, provider): (
+                _to_decimal(fees["percentage"]) / 100,
+                _to_decimal(fees["fixed"])
+            )
+            for payment_method, providers in self.pricing_config.get("payment_processing_fees", {}).items()
+            for provider, fees in providers.items()
+        }
+
+    def _compute_price(self, plan_id: str, billing_cycle: str) -> Optional[Tuple[float, float]]:
+        """Return (base, final) price for a plan and billing cycle, or None for custom-priced plans"""
+        plan = self._plans[plan_id]
+        if plan["price"] == "custom":
+            return None
+        
+        base_price = plan["price"][billing_cycle]
+        
+        # Apply annual discount if applicable
+        final_price = base_price * self._annual_factor if billing_cycle == "yearly" else base_price
+        return base_price, final_price
+
+    def calculate_subscription_price(self, plan_id: str, billing_cycle: str = "monthly") -> Dict[str, Any]:
         """Calculate subscription price with any applicable discounts"""
         try:
-            plan = self.pricing_config["subscription_plans"].get(plan_id)
+            plan = self._plans.get(plan_id)
             if not plan:
                 raise ValueError(f"Invalid plan ID: {plan_id}")
             
-            if plan["price"] == "custom":
+            prices = self._price_for(plan_id, billing_cycle)
+            if prices is None:
                 return {
                     "success": True,
                     "price": "Contact sales",
                     "billing_cycle": billing_cycle
                 }
             
-            base_price = plan["price"][billing_cycle]
-            
-            # Apply annual discount if applicable
-            if billing_cycle == "yearly":
-                annual_discount = self.pricing_config["promotional_offers"]["annual_discount"]
-                discount_amount = base_price * (annual_discount["percentage"] / 100)
-                final_price = base_price - discount_amount
-            else:
-                final_price = base_price
+            base_price, final_price = prices
             
             return {
                 "success": True,
@@ -73,77 +239,47 @@ class PricingManager:
                 "error": str(e)
             }
 
-    async def calculate_usage_cost(self, usage_data: Dict[str, Any]) -> Dict[str, Any]:
+    def calculate_usage_cost(self, usage_data: Dict[str, Any]) -> Dict[str, Any]:
         """Calculate cost based on usage"""
         try:
-            total_cost = Decimal('0')
-            cost_breakdown = {}
+            # Idle users have nothing to price; unknown models or resources
+            # still go through the full path so they are reported as errors
+            ai_tokens = usage_data.get("ai_tokens", {})
+            if (not (any(ai_tokens.values()) or usage_data.get("storage") or usage_data.get("api_calls"))
+                    and ai_tokens.keys() <= self._bulk_tables["ai_tokens"].keys()
+                    and all(resource in self._bulk_tables
+                            for resource in ("storage", "api_calls") if resource in usage_data)):
+                return {
+                    "success": True,
+                    "total_cost": 0.0,
+                    "breakdown": {}
+                }
             
-            # Calculate AI token usage cost
-            if "ai_tokens" in usage_data:
-                for model, tokens in usage_data["ai_tokens"].items():
-                    pricing = self.pricing_config["usage_based_pricing"]["ai_tokens"][model]
-                    tokens_in_thousands = tokens / 1000
-                    
-                    # Apply bulk discounts if applicable
-                    price_per_1k = pricing["price_per_1k"]
-                    for threshold, discounted_price in pricing["bulk_discounts"].items():
-                        threshold_value = int(threshold.replace("M+", "000000").replace("k+", "000"))
-                        if tokens >= threshold_value:
-                            price_per_1k = discounted_price
-                    
-                    cost = Decimal(str(tokens_in_thousands)) * Decimal(str(price_per_1k))
-                    total_cost += cost
-                    cost_breakdown["ai_tokens"] = {
-                        "usage": tokens,
-                        "rate": price_per_1k,
-                        "cost": float(cost)
-                    }
+            total_cost = 0
+            cost_breakdown = {}
             
-            # Calculate storage usage cost
-            if "storage" in usage_data:
-                storage_gb = usage_data["storage"]
-                pricing = self.pricing_config["usage_based_pricing"]["storage"]
-                
-                # Apply bulk discounts if applicable
-                price_per_gb = pricing["price_per_gb"]
-                for threshold, discounted_price in pricing["bulk_discounts"].items():
-                    threshold_value = int(threshold.replace("TB+", "000").replace("GB+", ""))
-                    if storage_gb >= threshold_value:
-                        price_per_gb = discounted_price
-                
-                cost = Decimal(str(storage_gb)) * Decimal(str(price_per_gb))
-                total_cost += cost
-                cost_breakdown["storage"] = {
-                    "usage": storage_gb,
-                    "rate": price_per_gb,
-                    "cost": float(cost)
-                }
+            # Price each metered resource against its bulk-discount tiers
+            metered = [
+                ("ai_tokens", tokens, self._bulk_tables["ai_tokens"][model])
+                for model, tokens in usage_data.get("ai_tokens", {}).items()
+            ]
+            metered += [
+                (resource, usage_data[resource], self._bulk_tables[resource])
+                for resource in ("storage", "api_calls") if resource in usage_data
+            ]
             
-            # Calculate API calls cost
-            if "api_calls" in usage_data:
-                calls = usage_data["api_calls"]
-                pricing = self.pricing_config["usage_based_pricing"]["api_calls"]
-                calls_in_thousands = calls / 1000
-                
-                # Apply bulk discounts if applicable
-                price_per_1k = pricing["price_per_1k"]
-                for threshold, discounted_price in pricing["bulk_discounts"].items():
-                    threshold_value = int(threshold.replace("M+", "000000").replace("k+", "000"))
-                    if calls >= threshold_value:
-                        price_per_1k = discounted_price
-                
-                cost = Decimal(str(calls_in_thousands)) * Decimal(str(price_per_1k))
+            for resource, usage, table in metered:
+                price, cost = _compute_metered(usage, table, METERED_DIVISORS[resource])
                 total_cost += cost
-                cost_breakdown["api_calls"] = {
-                    "usage": calls,
-                    "rate": price_per_1k,
-                    "cost": float(cost)
+                cost_breakdown[resource] = {
+                    "usage": usage,
+                    "rate": price / MICROS,
+                    "cost": cost / MICROS
                 }
             
             return {
                 "success": True,
-                "total_cost": float(total_cost),
+                "total_cost": total_cost / MICROS,
                 "breakdown": cost_breakdown
             }
 
@@ -155,23 +291,61 @@ class PricingManager:
                 "error": str(e)
             }
 
-    async def calculate_payment_fees(self, amount: Decimal, payment_method: str, provider: str) -> Dict[str, Any]:
-        """Calculate payment processing fees"""
+    def calculate_usage_costs_batch(self, usage_batch: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Calculate total usage costs for many users at once, e.g. for a billing run.
+
+        Uses float arithmetic over NumPy columns; use calculate_usage_cost for
+        the exact integer-arithmetic amount on an individual invoice.
+        """
         try:
-            if payment_method == "credit_card":
-                fees = self.pricing_config["payment_processing_fees"]["credit_card"][provider]
-                percentage_fee = amount * (Decimal(str(fees["percentage"])) / 100)
-                fixed_fee = Decimal(str(fees["fixed"]))
-                total_fee = percentage_fee + fixed_fee
+            totals = np.zeros(len(usage_batch), dtype=np.float64)
             
-            elif payment_method == "crypto":
-                fees = self.pricing_config["payment_processing_fees"]["crypto"][provider]
-                percentage_fee = amount * (Decimal(str(fees["percentage"])) / 100)
-                fixed_fee = Decimal(str(fees["fixed"]))
-                total_fee = percentage_fee + fixed_fee
+            for model, arrays in self._batch_tables["ai_tokens"].items():
+                tokens = np.array([u.get("ai_tokens", {}).get(model, 0) for u in usage_batch], dtype=np.float64)
+                totals += _tiered_costs(tokens, arrays, METERED_DIVISORS["ai_tokens"])
             
-            else:
-                raise ValueError(f"Invalid payment method: {payment_method}")
+            unknown_models = {
+                model for u in usage_batch for model in u.get("ai_tokens", {})
+            } - self._batch_tables["ai_tokens"].keys()
+            if unknown_models:
+                raise ValueError(f"Invalid AI models: {', '.join(sorted(unknown_models))}")
+            
+            if "storage" in self._batch_tables:
+                storage = np.array([u.get("storage", 0) for u in usage_batch], dtype=np.float64)
+                totals += _tiered_costs(storage, self._batch_tables["storage"], METERED_DIVISORS["storage"])
+            
+            if "api_calls" in self._batch_tables:
+                calls = np.array([u.get("api_calls", 0) for u in usage_batch], dtype=np.float64)
+                totals += _tiered_costs(calls, self._batch_tables["api_calls"], METERED_DIVISORS["api_calls"])
+            
+            return {
+                "success": True,
+                "total_costs": totals.round(6).tolist()
+            }
+
+        except Exception as e:
+            logger.error(f"Error calculating batch usage costs: {str(e)}")
+            capture_exception(e)
+            return {
+                "success": False,
+                "error": str(e)
+            }
+
+    def calculate_payment_fees(self, amount: Decimal, payment_method: str, provider: str) -> Dict[str, Any]:
+        """Calculate payment processing fees"""
+        try:
+            fees = self._fee_table.get((payment_method, provider))
+            if fees is None:
+                if payment_method not in self.pricing_config.get("payment_processing_fees", {}):
+                    raise ValueError(f"Invalid payment method: {payment_method}")
+                raise ValueError(f"Invalid provider for {payment_method}: {provider}")
+            
+            # Fees stay in Decimal: amounts (e.g. crypto) can carry more
+            # precision than the micro-units used for usage pricing
+            percentage_rate, fixed_fee = fees
+            amount = _to_decimal(amount)
+            percentage_fee = amount * percentage_rate
+            total_fee = percentage_fee + fixed_fee
             
             return {
                 "success": True,
@@ -192,11 +366,11 @@ class PricingManager:
                 "error": str(e)
             }
 
-    async def apply_promotional_offer(self, user_id: str, offer_type: str, plan_id: str = None) -> Dict[str, Any]:
+    def apply_promotional_offer(self, user_id: str, offer_type: str, plan_id: str = None) -> Dict[str, Any]:
         """Apply promotional offer to user's subscription"""
         try:
             if offer_type == "new_user_discount":
-                offer = self.pricing_config["promotional_offers"]["new_user_discount"]
+                offer = self._offers["new_user_discount"]
                 if plan_id not in offer["applicable_plans"]:
                     raise ValueError(f"Plan {plan_id} not eligible for new user discount")
                 
@@ -207,7 +381,7 @@ class PricingManager:
                 }
             
             elif offer_type == "referral":
-                offer = self.pricing_config["promotional_offers"]["referral_program"]
+                offer = self._offers["referral_program"]
                 return {
                     "success": True,
                     "referrer_reward": offer["referrer_reward"],
@@ -228,20 +402,25 @@ class PricingManager:
     async def track_usage(self, user_id: str, usage_type: str, amount: int) -> Dict[str, Any]:
         """Track user's resource usage"""
         try:
-            if user_id not in self.usage_tracking:
-                self.usage_tracking[user_id] = {
-                    "ai_tokens": 0,
-                    "storage": 0,
-                    "api_calls": 0,
-                    "last_updated": datetime.now().isoformat()
-                }
+            if usage_type not in USAGE_TYPES:
+                raise ValueError(f"Invalid usage type: {usage_type}")
             
-            self.usage_tracking[user_id][usage_type] += amount
-            self.usage_tracking[user_id]["last_updated"] = datetime.now().isoformat()
+            usage = self.usage_tracking.get(user_id)
+            if usage is None:
+                usage = self.usage_tracking[user_id] = UsageRecord()
+            
+            setattr(usage, usage_type, getattr(usage, usage_type) + amount)
+            usage.last_updated_ns = time.time_ns()
             
             return {
                 "success": True,
-                "current_usage": self.usage_tracking[user_id]
+                "current_usage": {
+                    "ai_tokens": usage.ai_tokens,
+                    "storage": usage.storage,
+                    "api_calls": usage.api_calls,
+                    "messages": usage.messages,
+                    "last_updated": _format_ns(usage.last_updated_ns)
+                }
             }
 
         except Exception as e:
@@ -273,19 +452,20 @@ class PricingManager:
             usage = self.usage_tracking[user_id]
             
             # Calculate costs
-            costs = await self.calculate_usage_cost({
-                "ai_tokens": {"gpt-3.5-turbo": usage["ai_tokens"]},
-                "storage": usage["storage"],
-                "api_calls": usage["api_calls"]
+            costs = self.calculate_usage_cost({
+                "ai_tokens": {"gpt-3.5-turbo": usage.ai_tokens},
+                "storage": usage.storage,
+                "api_calls": usage.api_calls
             })
             
             return {
                 "success": True,
                 "usage": {
-                    "ai_tokens": usage["ai_tokens"],
-                    "storage": usage["storage"],
-                    "api_calls": usage["api_calls"]
+                    "ai_tokens": usage.ai_tokens,
+                    "storage": usage.storage,
+                    "api_calls": usage.api_calls
                 },
+                "last_updated": _format_ns(usage.last_updated_ns),
                 "costs": costs["breakdown"] if costs["success"] else None,
                 "period": {
                     "start": start_date.isoformat() if start_date else None,
@@ -304,8 +484,8 @@ class PricingManager:
     async def check_usage_limits(self, user_id: str, plan_id: str) -> Dict[str, Any]:
         """Check if user has exceeded their plan limits"""
         try:
-            plan = self.pricing_config["subscription_plans"].get(plan_id)
-            if not plan:
+            plan_limits = self._plan_limits.get(plan_id)
+            if plan_limits is None:
                 raise ValueError(f"Invalid plan ID: {plan_id}")
             
             if user_id not in self.usage_tracking:
@@ -315,23 +495,15 @@ class PricingManager:
                 }
             
             usage = self.usage_tracking[user_id]
-            limits = plan["limits"]
             
             # Check each limit
             exceeded_limits = {}
-            
-            if limits["monthly_messages"] != "unlimited":
-                if usage.get("messages", 0) > limits["monthly_messages"]:
-                    exceeded_limits["messages"] = {
-                        "limit": limits["monthly_messages"],
-                        "current": usage["messages"]
-                    }
-            
-            if limits["storage_gb"] != "unlimited" and limits["storage_gb"] != "custom":
-                if usage["storage"] > limits["storage_gb"]:
-                    exceeded_limits["storage"] = {
-                        "limit": limits["storage_gb"],
-                        "current": usage["storage"]
+            for usage_type, limit in plan_limits:
+                current = getattr(usage, usage_type)
+                if limit is not None and current > limit:
+                    exceeded_limits[usage_type] = {
+                        "limit": limit,
+                        "current": current
                     }
             
             return {
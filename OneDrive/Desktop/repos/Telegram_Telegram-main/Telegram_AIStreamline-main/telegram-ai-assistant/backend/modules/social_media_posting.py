@@ -1,17 +1,31 @@
 import logging
-from typing import Dict, Any, List, Optional
+from typing import Deque, Dict, Any, List, Optional
 import tweepy
 from linkedin_api import Linkedin
 import facebook
 import asyncio
+from collections import deque
 from datetime import datetime
+from itertools import islice
 import aiohttp
+import aiofiles
+import aiofiles.tempfile
 from pathlib import Path
-import tempfile
+import io
 import os
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_HISTORY_LIMIT = 10_000
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+HTTP_CONNECTION_LIMIT = 32
+HTTP_DNS_CACHE_TTL = 300
+
+
+def _tail(items: Deque[Dict[str, Any]], limit: int) -> List[Dict[str, Any]]:
+    """Return the last `limit` items of a deque without slicing it"""
+    return list(islice(reversed(items), limit))[::-1]
+
 class SocialMediaPosting:
     def __init__(self, config: Dict[str, Any]):
         """Initialize social media posting with configuration"""
@@ -45,7 +59,15 @@ class SocialMediaPosting:
             self.facebook_page_id = self.social_config["facebook"]["page_id"]
         
         # Initialize post history
-        self.post_history: List[Dict[str, Any]] = []
+        self.post_history: Deque[Dict[str, Any]] = deque(
+            maxlen=self.social_config.get("history_limit", DEFAULT_HISTORY_LIMIT)
+        )
+        self._total_posts = 0
+        self._success_counts = {"twitter": 0, "linkedin": 0, "facebook": 0}
+        
+        # Shared HTTP session for media downloads, created on first use
+        self._http: Optional[aiohttp.ClientSession] = None
+        self._http_lock = asyncio.Lock()
         
         logger.info("Social Media Posting initialized successfully")
 
@@ -61,16 +83,18 @@ class SocialMediaPosting:
             
             # Download media files if provided
             media_files = []
+            media: Dict[str, bytes] = {}
             if media_urls:
                 media_files = await self._download_media_files(media_urls)
+                media = await self._read_media_files(media_files)
             
             # Create posting tasks for enabled platforms
             if self.social_config["twitter"]["enabled"]:
-                posting_tasks.append(self._post_to_twitter(content, media_files))
+                posting_tasks.append(self._post_to_twitter(content, media))
             if self.social_config["linkedin"]["enabled"]:
-                posting_tasks.append(self._post_to_linkedin(content, media_files))
+                posting_tasks.append(self._post_to_linkedin(content, media))
             if self.social_config["facebook"]["enabled"]:
-                posting_tasks.append(self._post_to_facebook(content, media_files))
+                posting_tasks.append(self._post_to_facebook(content, media))
             
             # Execute all posting tasks concurrently
             results = await asyncio.gather(*posting_tasks, return_exceptions=True)
@@ -102,33 +126,72 @@ class SocialMediaPosting:
 
     async def _download_media_files(self, urls: List[str]) -> List[str]:
         """Download media files from URLs"""
-        media_files = []
         try:
-            async with aiohttp.ClientSession() as session:
-                for url in urls:
-                    try:
-                        # Create temporary file
-                        temp_file = tempfile.NamedTemporaryFile(delete=False)
-                        
-                        # Download file
-                        async with session.get(url) as response:
-                            if response.status == 200:
-                                content = await response.read()
-                                temp_file.write(content)
-                                temp_file.close()
-                                media_files.append(temp_file.name)
-                            else:
-                                logger.error(f"Error downloading media from {url}: {response.status}")
-                                
-                    except Exception as e:
-                        logger.error(f"Error downloading media from {url}: {str(e)}")
-                        
+            session = await self._ensure_session()
+            results = await asyncio.gather(
+                *[self._download_media_file(session, url) for url in urls],
+                return_exceptions=True
+            )
+            
+            media_files = []
+            for url, result in zip(urls, results):
+                if isinstance(result, Exception):
+                    logger.error(f"Error downloading media from {url}: {str(result)}")
+                elif result:
+                    media_files.append(result)
             return media_files
             
         except Exception as e:
             logger.error(f"Error in media download: {str(e)}")
             return []
 
+    async def _ensure_session(self) -> aiohttp.ClientSession:
+        """Return the shared HTTP session, creating it on first use"""
+        if self._http is None or self._http.closed:
+            async with self._http_lock:
+                if self._http is None or self._http.closed:
+                    self._http = aiohttp.ClientSession(
+                        connector=aiohttp.TCPConnector(
+                            limit=HTTP_CONNECTION_LIMIT,
+                            ttl_dns_cache=HTTP_DNS_CACHE_TTL
+                        )
+                    )
+        return self._http
+
+    async def close(self) -> None:
+        """Close the shared HTTP session"""
+        try:
+            if self._http is not None and not self._http.closed:
+                await self._http.close()
+                
+        except Exception as e:
+            logger.error(f"Error closing social media HTTP session: {str(e)}")
+
+    async def _download_media_file(self, session: aiohttp.ClientSession, url: str) -> Optional[str]:
+        """Stream a single media file to a temporary file in chunks"""
+        async with session.get(url) as response:
+            if response.status != 200:
+                logger.error(f"Error downloading media from {url}: {response.status}")
+                return None
+            
+            async with aiofiles.tempfile.NamedTemporaryFile("wb", delete=False) as temp_file:
+                try:
+                    async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                        await temp_file.write(chunk)
+                except Exception:
+                    await self._cleanup_media_files([temp_file.name])
+                    raise
+                return temp_file.name
+
+    async def _read_media_files(self, file_paths: List[str]) -> Dict[str, bytes]:
+        """Read downloaded media files once so every platform can share the bytes"""
+        async def read(file_path: str) -> bytes:
+            async with aiofiles.open(file_path, "rb") as f:
+                return await f.read()
+        
+        contents = await asyncio.gather(*[read(file_path) for file_path in file_paths])
+        return dict(zip(file_paths, contents))
+
     async def _cleanup_media_files(self, file_paths: List[str]) -> None:
         """Clean up downloaded media files"""
         for file_path in file_paths:
@@ -138,18 +201,21 @@ class SocialMediaPosting:
             except Exception as e:
                 logger.error(f"Error cleaning up media file {file_path}: {str(e)}")
 
-    async def _post_to_twitter(self, content: str, media_files: List[str]) -> Dict[str, Any]:
+    async def _post_to_twitter(self, content: str, media: Dict[str, bytes]) -> Dict[str, Any]:
         """Post content to Twitter"""
         try:
             media_ids = []
             
             # Upload media files if any
-            for media_file in media_files:
-                media = self.twitter_client.media_upload(media_file)
-                media_ids.append(media.media_id)
+            for media_file, data in media.items():
+                uploaded = await asyncio.to_thread(
+                    self.twitter_client.media_upload, media_file, file=io.BytesIO(data)
+                )
+                media_ids.append(uploaded.media_id)
             
             # Post tweet
-            tweet = self.twitter_client.update_status(
+            tweet = await asyncio.to_thread(
+                self.twitter_client.update_status,
                 status=content[:280],  # Twitter's character limit
                 media_ids=media_ids if media_ids else None
             )
@@ -169,7 +235,7 @@ class SocialMediaPosting:
                 "error": str(e)
             }
 
-    async def _post_to_linkedin(self, content: str, media_files: List[str]) -> Dict[str, Any]:
+    async def _post_to_linkedin(self, content: str, media: Dict[str, bytes]) -> Dict[str, Any]:
         """Post content to LinkedIn"""
         try:
             # Prepare post data
@@ -190,19 +256,18 @@ class SocialMediaPosting:
             }
             
             # Add media if provided
-            if media_files:
-                media_assets = []
-                for media_file in media_files:
-                    asset = await self._upload_media_to_linkedin(media_file)
-                    if asset:
-                        media_assets.append(asset)
+            if media:
+                assets = await asyncio.gather(
+                    *[self._upload_media_to_linkedin(data) for data in media.values()]
+                )
+                media_assets = [asset for asset in assets if asset]
                 
                 if media_assets:
                     post_data["specificContent"]["com.linkedin.ugc.ShareContent"]["shareMediaCategory"] = "IMAGE"
                     post_data["specificContent"]["com.linkedin.ugc.ShareContent"]["media"] = media_assets
             
             # Create post
-            post = self.linkedin_client.posts.create(post_data)
+            post = await asyncio.to_thread(self.linkedin_client.posts.create, post_data)
             
             return {
                 "success": True,
@@ -218,7 +283,7 @@ class SocialMediaPosting:
                 "error": str(e)
             }
 
-    async def _post_to_facebook(self, content: str, media_files: List[str]) -> Dict[str, Any]:
+    async def _post_to_facebook(self, content: str, media: Dict[str, bytes]) -> Dict[str, Any]:
         """Post content to Facebook"""
         try:
             post_args = {
@@ -226,36 +291,33 @@ class SocialMediaPosting:
             }
             
             # Add media if provided
-            if media_files:
-                if len(media_files) == 1:
+            if media:
+                if len(media) == 1:
                     # Single photo
-                    with open(media_files[0], "rb") as photo:
-                        post = self.facebook_client.put_photo(
-                            image=photo.read(),
-                            message=content,
-                            album_path=f"{self.facebook_page_id}/photos"
-                        )
+                    post = await asyncio.to_thread(
+                        self.facebook_client.put_photo,
+                        image=next(iter(media.values())),
+                        message=content,
+                        album_path=f"{self.facebook_page_id}/photos"
+                    )
                 else:
                     # Multiple photos
-                    media_ids = []
-                    for media_file in media_files:
-                        with open(media_file, "rb") as photo:
-                            result = self.facebook_client.put_photo(
-                                image=photo.read(),
-                                album_path=f"{self.facebook_page_id}/photos",
-                                published=False
-                            )
-                            media_ids.append({"media_fbid": result["id"]})
+                    results = await asyncio.gather(
+                        *[self._upload_unpublished_facebook_photo(image) for image in media.values()]
+                    )
+                    media_ids = [{"media_fbid": result["id"]} for result in results]
                     
                     post_args["attached_media"] = media_ids
-                    post = self.facebook_client.put_object(
+                    post = await asyncio.to_thread(
+                        self.facebook_client.put_object,
                         parent_object=self.facebook_page_id,
                         connection_name="feed",
                         **post_args
                     )
             else:
                 # Text-only post
-                post = self.facebook_client.put_object(
+                post = await asyncio.to_thread(
+                    self.facebook_client.put_object,
                     parent_object=self.facebook_page_id,
                     connection_name="feed",
                     **post_args
@@ -276,11 +338,20 @@ class SocialMediaPosting:
                 "error": str(e)
             }
 
-    async def _upload_media_to_linkedin(self, media_file: str) -> Optional[Dict[str, Any]]:
+    async def _upload_unpublished_facebook_photo(self, image: bytes) -> Dict[str, Any]:
+        """Upload a photo to Facebook without publishing it, for attaching to a post"""
+        return await asyncio.to_thread(
+            self.facebook_client.put_photo,
+            image=image,
+            album_path=f"{self.facebook_page_id}/photos",
+            published=False
+        )
+
+    async def _upload_media_to_linkedin(self, media_binary: bytes) -> Optional[Dict[str, Any]]:
         """Upload media to LinkedIn"""
         try:
             # Register media upload
-            register_upload = self.linkedin_client.media.register_upload({
+            register_upload = await asyncio.to_thread(self.linkedin_client.media.register_upload, {
                 "registerUploadRequest": {
                     "recipes": ["urn:li:digitalmediaRecipe:feedshare-image"],
                     "owner": "urn:li:person:me",
@@ -292,11 +363,11 @@ class SocialMediaPosting:
             })
             
             # Upload media binary
-            with open(media_file, "rb") as f:
-                self.linkedin_client.media.upload_media_binary(
-                    register_upload["value"]["uploadMechanism"]["com.linkedin.digitalmedia.uploading.MediaUploadHttpRequest"]["uploadUrl"],
-                    f.read()
-                )
+            await asyncio.to_thread(
+                self.linkedin_client.media.upload_media_binary,
+                register_upload["value"]["uploadMechanism"]["com.linkedin.digitalmedia.uploading.MediaUploadHttpRequest"]["uploadUrl"],
+                media_binary
+            )
             
             return {
                 "status": "READY",
@@ -314,33 +385,36 @@ class SocialMediaPosting:
             "timestamp": datetime.now().isoformat(),
             "results": results
         })
+        
+        # Keep analytics counters current so get_analytics never rescans history
+        self._total_posts += 1
+        for platform, result in results.items():
+            if result.get("success"):
+                self._success_counts[platform] = self._success_counts.get(platform, 0) + 1
 
     async def get_analytics(self) -> Dict[str, Any]:
         """Get posting analytics"""
         return {
-            "total_posts": len(self.post_history),
+            "total_posts": self._total_posts,
             "platforms": {
                 "twitter": {
                     "enabled": self.social_config["twitter"]["enabled"],
-                    "posts": sum(1 for post in self.post_history 
-                               if "twitter" in post["results"] and post["results"]["twitter"]["success"])
+                    "posts": self._success_counts["twitter"]
                 },
                 "linkedin": {
                     "enabled": self.social_config["linkedin"]["enabled"],
-                    "posts": sum(1 for post in self.post_history 
-                               if "linkedin" in post["results"] and post["results"]["linkedin"]["success"])
+                    "posts": self._success_counts["linkedin"]
                 },
                 "facebook": {
                     "enabled": self.social_config["facebook"]["enabled"],
-                    "posts": sum(1 for post in self.post_history 
-                               if "facebook" in post["results"] and post["results"]["facebook"]["success"])
+                    "posts": self._success_counts["facebook"]
                 }
             },
-            "recent_posts": self.post_history[-5:]  # Last 5 posts
+            "recent_posts": _tail(self.post_history, 5)  # Last 5 posts
         }
 
     async def get_post_history(self, limit: int = None) -> List[Dict[str, Any]]:
         """Get post history with optional limit"""
         if limit:
-            return self.post_history[-limit:]
-        return self.post_history
+            return _tail(self.post_history, limit)
+        return list(self.post_history)
@@ -1,10 +1,16 @@
 import logging
-from typing import Dict, Any, List, Optional
+from typing import Awaitable, Callable, Dict, Any, Final, List, Optional, Set, Tuple
 import aiohttp
 import asyncio
-from datetime import datetime
-import json
+import itertools
+from collections import OrderedDict
+import time
+from datetime import datetime, timezone
+from functools import wraps
 from pathlib import Path
+import openai
+import orjson
+import redis.asyncio as redis
 from sentry_config import capture_exception
 from telegram import Bot, Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
@@ -22,463 +28,642 @@ from .unified_payment_gateway import UnifiedPaymentGateway
 
 logger = logging.getLogger(__name__)
 
+# Run the bot on uvloop's libuv-based event loop where available; uvloop does
+# not support Windows, so fall back to the default asyncio loop there
+try:
+    import uvloop
+    uvloop.install()
+except ImportError:
+    logger.info("uvloop not available, using the default asyncio event loop")
+
+# Defaults for config["telegram"]["pool"]; concurrency and pool sizes must be
+# tuned together so concurrent updates don't starve the HTTP connection pool
+DEFAULT_POOL_SETTINGS = {
+    "concurrent_updates": True,
+    "connection_pool_size": 256,
+    "pool_timeout": 20,
+    "get_updates_connection_pool_size": 16
+}
+
+# Plans shown by the pricing callback
+PRICING_PLANS = {
+    "basic": {
+        "name": "Basic",
+        "price": "$29/month",
+        "features": [
+            "AI Chatbot",
+            "Basic CRM Integration",
+            "Email Support"
+        ]
+    },
+    "pro": {
+        "name": "Professional",
+        "price": "$99/month",
+        "features": [
+            "Everything in Basic",
+            "Advanced AI Features",
+            "Priority Support"
+        ]
+    },
+    "enterprise": {
+        "name": "Enterprise",
+        "price": "Custom",
+        "features": [
+            "Everything in Pro",
+            "Custom Integrations",
+            "Dedicated Support"
+        ]
+    }
+}
+
+
+def _format_pricing(plans: Dict[str, Dict[str, Any]]) -> str:
+    """Render the pricing plans as a chat message"""
+    message = "📊 Our Pricing Plans:\n\n"
+    for details in plans.values():
+        message += f"🔹 {details['name']} - {details['price']}\n"
+        for feature in details['features']:
+            message += f"  ✓ {feature}\n"
+        message += "\n"
+    return message
+
+
+PRICING_MESSAGE = _format_pricing(PRICING_PLANS)
+
+# Steps walked through by /onboard
+ONBOARDING_STEPS: Final[Tuple[Dict[str, str], ...]] = (
+    {
+        "id": "welcome",
+        "title": "Welcome",
+        "description": "Let's get you started with our platform"
+    },
+    {
+        "id": "business_info",
+        "title": "Business Information",
+        "description": "Tell us about your business"
+    },
+    {
+        "id": "integrations",
+        "title": "Setup Integrations",
+        "description": "Connect your tools and services"
+    },
+    {
+        "id": "payment",
+        "title": "Payment Setup",
+        "description": "Choose your payment method"
+    }
+)
+
+ONBOARDING_INTRO: Final[str] = (
+    "Welcome to the onboarding process! We'll help you set up:\n\n" +
+    "\n".join(f"✓ {step['title']}" for step in ONBOARDING_STEPS)
+)
+
+# Broadcast sends issued concurrently per batch; keep at or below the
+# connection pool size so a batch never queues for a connection
+BROADCAST_BATCH_SIZE = 50
+
+# Most recent broadcast results kept in memory; older ones are evicted first
+DEFAULT_BROADCAST_HISTORY_LIMIT = 1000
+
+FALLBACK_MESSAGE = "Sorry, something went wrong. Please try again later."
+
+# Per-user message rate limit, enforced with a fixed window counter in Redis
+RATE_LIMIT_KEY = "rl:{user_id}"
+RATE_LIMIT_REQUESTS = 20
+RATE_LIMIT_SECONDS = 60
+RATE_LIMIT_MESSAGE = "You're sending messages too quickly. Please wait a moment and try again."
+
+HELP_MESSAGE = (
+    "Here's what I can do:\n\n"
+    "/start - Get started\n"
+    "/onboard - Set up your account\n"
+    "/support - Contact our support team\n"
+    "/help - Show this message\n\n"
+    "You can also just send me a message and I'll do my best to help!"
+)
+
+
+# Strong references to in-flight error reports so they aren't garbage collected
+_report_tasks: Set[asyncio.Task] = set()
+
+
+def _report_exception(e: Exception) -> None:
+    """Send an exception to Sentry in a worker thread without blocking the handler"""
+    task = asyncio.create_task(asyncio.to_thread(capture_exception, e))
+    _report_tasks.add(task)
+    task.add_done_callback(_report_tasks.discard)
+
+
+def safe_handler(fn: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+    """Log and report handler errors, then send the user a fallback reply"""
+    @wraps(fn)
+    async def wrapper(self, update: Update, context: ContextTypes.DEFAULT_TYPE, *args, **kwargs):
+        try:
+            return await fn(self, update, context, *args, **kwargs)
+        except Exception as e:
+            logger.exception("Error in Telegram handler %s", fn.__name__)
+            _report_exception(e)
+            await self._safe_reply(update, FALLBACK_MESSAGE)
+    return wrapper
+
+# User sessions live in Redis so any bot worker can serve any user. Each
+# session is a hash with one JSON-encoded field per value, so handlers
+# running concurrently for the same user only write the fields they change
+SESSION_KEY = "sess:{user_id}"
+SESSION_TTL = 3600
+SESSION_DATA_PREFIX = "data:"
+
+
+def _session_fields(state: Optional[str], data: Dict[str, Any]) -> Dict[str, bytes]:
+    """Encode session values as hash fields"""
+    fields = {f"{SESSION_DATA_PREFIX}{name}": orjson.dumps(value) for name, value in data.items()}
+    if state is not None:
+        fields["state"] = orjson.dumps(state)
+    return fields
+
 class TelegramMarketingBot:
+    # Bot commands and the methods that handle them
+    _CMD_HANDLERS = (
+        ("start", "_handle_start"),
+        ("help", "_handle_help"),
+        ("onboard", "_handle_onboard"),
+        ("support", "_handle_support")
+    )
+
     def __init__(self, config: Dict[str, Any]):
         """Initialize Telegram marketing bot"""
         self.config = config
         self.bot_token = config["telegram"]["bot_token"]
+        self.pool_settings = {**DEFAULT_POOL_SETTINGS, **config["telegram"].get("pool", {})}
+        self.http: Optional[aiohttp.ClientSession] = None
         self.ai_chatbot = AIChatbot(config)
         self.content = ContentAutomation(config)
         self.marketing = MarketingAutomation(config)
         self.payment = UnifiedPaymentGateway(config)
         
         # Initialize tracking
-        self.user_sessions: Dict[int, Dict[str, Any]] = {}
+        self.redis = redis.Redis.from_url(config["database"]["redis_url"], decode_responses=True)
+        self._business_name = config["business"]["name"]
+        self._value_prop = config["business"]["value_prop"]
+        self._content_payloads = {
+            section: {
+                "business_name": self._business_name,
+                "value_proposition": self._value_prop,
+                "section": section
+            }
+            for section in ("welcome", "features")
+        }
+        self._content_cache: Dict[str, Dict[str, Any]] = {}
         self.group_tracking: Dict[int, Dict[str, Any]] = {}
-        self.broadcast_tracking: Dict[str, Dict[str, Any]] = {}
+        self.broadcast_tracking: OrderedDict[str, Dict[str, Any]] = OrderedDict()
+        self._broadcast_history_limit = config["telegram"].get(
+            "broadcast_history_limit", DEFAULT_BROADCAST_HISTORY_LIMIT
+        )
+        
+        # Ticket IDs: process start time plus a sequence, unique even within a second
+        self._ticket_epoch = int(time.time())
+        self._ticket_seq = itertools.count(1)
+        
+        # Static inline keyboards, built once and shared across updates
+        self._kb_welcome = InlineKeyboardMarkup([
+            [
+                InlineKeyboardButton("Start Onboarding", callback_data="onboard"),
+                InlineKeyboardButton("Learn More", callback_data="learn_more")
+            ],
+            [
+                InlineKeyboardButton("Get Support", callback_data="support"),
+                InlineKeyboardButton("View Pricing", callback_data="pricing")
+            ]
+        ])
+        self._kb_onboard = InlineKeyboardMarkup([
+            [InlineKeyboardButton("Start Setup", callback_data="onboard_start")],
+            [InlineKeyboardButton("Skip for Now", callback_data="onboard_skip")]
+        ])
+        self._kb_support = InlineKeyboardMarkup([
+            [
+                InlineKeyboardButton("Technical Issue", callback_data="support_tech"),
+                InlineKeyboardButton("Billing Issue", callback_data="support_billing")
+            ],
+            [
+                InlineKeyboardButton("Feature Request", callback_data="support_feature"),
+                InlineKeyboardButton("Other", callback_data="support_other")
+            ]
+        ])
+        self._kb_skip_onboard = InlineKeyboardMarkup([
+            [InlineKeyboardButton("Start Onboarding", callback_data="onboard_start")]
+        ])
+        self._kb_integrations = InlineKeyboardMarkup([
+            [
+                InlineKeyboardButton("CRM Integration", callback_data="integrate_crm"),
+                InlineKeyboardButton("Payment Setup", callback_data="integrate_payment")
+            ],
+            [InlineKeyboardButton("Skip Integrations", callback_data="integrate_skip")]
+        ])
+        self._kb_payment_methods = InlineKeyboardMarkup([
+            [
+                InlineKeyboardButton("Credit Card", callback_data="payment_card"),
+                InlineKeyboardButton("Crypto", callback_data="payment_crypto")
+            ]
+        ])
+        self._kb_learn_more = InlineKeyboardMarkup([
+            [
+                InlineKeyboardButton("Start Free Trial", callback_data="onboard_start"),
+                InlineKeyboardButton("View Pricing", callback_data="pricing")
+            ]
+        ])
+        self._kb_pricing_cta = InlineKeyboardMarkup([
+            [InlineKeyboardButton("Start Free Trial", callback_data="onboard_start")]
+        ])
+        
+        # Callback routing: exact callback_data first, then the "<prefix>_" family
+        self._cb_exact = {
+            "learn_more": self._send_learn_more_info,
+            "pricing": self._send_pricing_info
+        }
+        self._cb_prefix = {
+            "onboard_": self._handle_onboarding_callback,
+            "support_": self._handle_support_callback
+        }
         
         logger.info("Telegram Marketing Bot initialized")
 
     async def start(self):
         """Start the Telegram bot"""
         try:
-            self.application = Application.builder().token(self.bot_token).build()
+            # Shared HTTP connection pool; the AI chatbot's OpenAI requests reuse it
+            # through openai.aiosession instead of opening a session per call.
+            # Set before the application starts so handler tasks inherit it.
+            self.http = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=200,
+                    limit_per_host=50,
+                    ttl_dns_cache=300,
+                    keepalive_timeout=60
+                )
+            )
+            openai.aiosession.set(self.http)
+            
+            pool = self.pool_settings
+            self.application = (
+                Application.builder()
+                .token(self.bot_token)
+                .concurrent_updates(pool["concurrent_updates"])
+                .connection_pool_size(pool["connection_pool_size"])
+                .pool_timeout(pool["pool_timeout"])
+                .get_updates_connection_pool_size(pool["get_updates_connection_pool_size"])
+                .build()
+            )
             
             # Add command handlers
-            self.application.add_handler(CommandHandler("start", self._handle_start))
-            self.application.add_handler(CommandHandler("help", self._handle_help))
-            self.application.add_handler(CommandHandler("onboard", self._handle_onboard))
-            self.application.add_handler(CommandHandler("support", self._handle_support))
+            for command, attr in self._CMD_HANDLERS:
+                self.application.add_handler(CommandHandler(command, getattr(self, attr)))
             
             # Add message handlers
             self.application.add_handler(MessageHandler(filters.TEXT, self._handle_message))
             self.application.add_handler(CallbackQueryHandler(self._handle_callback))
             
-            # Start the bot
+            # Start the bot; webhook mode lets several workers share one bot token
             await self.application.initialize()
             await self.application.start()
-            await self.application.run_polling()
+            
+            telegram_config = self.config["telegram"]
+            if telegram_config.get("mode", "polling") == "webhook":
+                # start_webhook also registers the webhook URL with Telegram
+                await self.application.updater.start_webhook(
+                    listen=telegram_config.get("webhook_listen", "0.0.0.0"),
+                    port=telegram_config.get("webhook_port", 8443),
+                    url_path=self.bot_token,
+                    webhook_url=f"{telegram_config['webhook_url']}/{self.bot_token}"
+                )
+            else:
+                await self.application.updater.start_polling()
 
         except Exception as e:
             logger.error(f"Error starting Telegram bot: {str(e)}")
             capture_exception(e)
 
-    async def _handle_start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Handle /start command"""
+    async def stop(self):
+        """Stop receiving updates and shut the bot down"""
         try:
-            user_id = update.effective_user.id
-            
-            # Initialize user session
-            self.user_sessions[user_id] = {
-                "state": "welcome",
-                "data": {},
-                "started_at": datetime.now().isoformat()
-            }
-            
-            # Generate welcome message
-            welcome_content = await self.content.generate_website_content({
-                "business_name": self.config["business"]["name"],
-                "value_proposition": self.config["business"]["value_prop"],
-                "section": "welcome"
-            })
-            
-            # Create welcome keyboard
-            keyboard = [
-                [
-                    InlineKeyboardButton("Start Onboarding", callback_data="onboard"),
-                    InlineKeyboardButton("Learn More", callback_data="learn_more")
-                ],
-                [
-                    InlineKeyboardButton("Get Support", callback_data="support"),
-                    InlineKeyboardButton("View Pricing", callback_data="pricing")
-                ]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            await update.message.reply_text(
-                welcome_content["hero"]["description"],
-                reply_markup=reply_markup
-            )
+            if self.application.updater.running:
+                await self.application.updater.stop()
+            await self.application.stop()
+            await self.application.shutdown()
+            
+            await asyncio.gather(self.payment.close(), self.content.close())
+            if self.http is not None and not self.http.closed:
+                await self.http.close()
 
         except Exception as e:
-            logger.error(f"Error handling start command: {str(e)}")
+            logger.error(f"Error stopping Telegram bot: {str(e)}")
             capture_exception(e)
-            await update.message.reply_text(
-                "Sorry, something went wrong. Please try again later."
-            )
 
-    async def _handle_onboard(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Handle /onboard command"""
+    async def broadcast(self, user_ids: List[int], text: str,
+                        batch_size: int = BROADCAST_BATCH_SIZE) -> Dict[str, Any]:
+        """Send a message to many users in concurrent batches"""
         try:
-            user_id = update.effective_user.id
-            
-            # Initialize onboarding session
-            self.user_sessions[user_id] = {
-                "state": "onboarding_start",
-                "data": {
-                    "step": 0,
-                    "completed_steps": []
-                },
-                "started_at": datetime.now().isoformat()
+            broadcast_id = f"broadcast_{time.time_ns()}"
+            sent, failed = 0, []
+            
+            for start in range(0, len(user_ids), batch_size):
+                batch = user_ids[start:start + batch_size]
+                results = await asyncio.gather(
+                    *[self.application.bot.send_message(user_id, text) for user_id in batch],
+                    return_exceptions=True
+                )
+                for user_id, result in zip(batch, results):
+                    if isinstance(result, Exception):
+                        failed.append(user_id)
+                    else:
+                        sent += 1
+            
+            self.broadcast_tracking[broadcast_id] = {
+                "recipients": len(user_ids),
+                "sent": sent,
+                "failed": failed,
+                "completed_at": datetime.now(timezone.utc).isoformat()
+            }
+            while len(self.broadcast_tracking) > self._broadcast_history_limit:
+                self.broadcast_tracking.popitem(last=False)
+            
+            return {
+                "success": True,
+                "broadcast_id": broadcast_id,
+                "sent": sent,
+                "failed": failed
             }
-            
-            # Get onboarding steps
-            onboarding_steps = [
-                {
-                    "id": "welcome",
-                    "title": "Welcome",
-                    "description": "Let's get you started with our platform"
-                },
-                {
-                    "id": "business_info",
-                    "title": "Business Information",
-                    "description": "Tell us about your business"
-                },
-                {
-                    "id": "integrations",
-                    "title": "Setup Integrations",
-                    "description": "Connect your tools and services"
-                },
-                {
-                    "id": "payment",
-                    "title": "Payment Setup",
-                    "description": "Choose your payment method"
-                }
-            ]
-            
-            # Create onboarding keyboard
-            keyboard = [
-                [InlineKeyboardButton("Start Setup", callback_data="onboard_start")],
-                [InlineKeyboardButton("Skip for Now", callback_data="onboard_skip")]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            await update.message.reply_text(
-                f"Welcome to the onboarding process! We'll help you set up:\n\n" +
-                "\n".join([f"✓ {step['title']}" for step in onboarding_steps]),
-                reply_markup=reply_markup
-            )
 
         except Exception as e:
-            logger.error(f"Error handling onboard command: {str(e)}")
+            logger.error(f"Error sending broadcast: {str(e)}")
             capture_exception(e)
-            await update.message.reply_text(
-                "Sorry, something went wrong. Please try again later."
-            )
+            return {
+                "success": False,
+                "error": str(e)
+            }
 
-    async def _handle_support(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Handle /support command"""
+    async def _safe_reply(self, update: Update, text: str) -> None:
+        """Reply to the update's message, ignoring failures to deliver the reply"""
         try:
-            user_id = update.effective_user.id
-            
-            # Initialize support session
-            self.user_sessions[user_id] = {
-                "state": "support",
-                "data": {
-                    "issue_type": None,
-                    "description": None
-                },
-                "started_at": datetime.now().isoformat()
-            }
-            
-            # Create support keyboard
-            keyboard = [
-                [
-                    InlineKeyboardButton("Technical Issue", callback_data="support_tech"),
-                    InlineKeyboardButton("Billing Issue", callback_data="support_billing")
-                ],
-                [
-                    InlineKeyboardButton("Feature Request", callback_data="support_feature"),
-                    InlineKeyboardButton("Other", callback_data="support_other")
-                ]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            await update.message.reply_text(
-                "How can we help you today? Please select an option below:",
-                reply_markup=reply_markup
-            )
+            if update.effective_message:
+                await update.effective_message.reply_text(text)
+        except Exception:
+            logger.exception("Error sending fallback reply")
 
-        except Exception as e:
-            logger.error(f"Error handling support command: {str(e)}")
-            capture_exception(e)
-            await update.message.reply_text(
-                "Sorry, something went wrong. Please try again later."
-            )
+    async def _is_rate_limited(self, user_id: int) -> bool:
+        """Count a message against the user's rate limit window"""
+        key = RATE_LIMIT_KEY.format(user_id=user_id)
+        count = await self.redis.incr(key)
+        if count == 1:
+            await self.redis.expire(key, RATE_LIMIT_SECONDS)
+        return count > RATE_LIMIT_REQUESTS
 
-    async def _handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Handle incoming messages"""
-        try:
-            user_id = update.effective_user.id
-            message_text = update.message.text
-            
-            if user_id not in self.user_sessions:
-                # Initialize new session
-                self.user_sessions[user_id] = {
-                    "state": "chat",
-                    "data": {},
-                    "started_at": datetime.now().isoformat()
-                }
-            
-            session = self.user_sessions[user_id]
-            state = session["state"]
-            
-            if state == "onboarding_business_info":
-                # Handle business info collection
-                session["data"]["business_info"] = message_text
-                await self._proceed_onboarding(update, context, user_id)
-            
-            elif state == "support_description":
-                # Handle support ticket description
-                session["data"]["description"] = message_text
-                await self._create_support_ticket(update, context, user_id)
-            
+    async def _load_session(self, user_id: int) -> Dict[str, Any]:
+        """Load a user's session from Redis, starting a chat session if none exists"""
+        fields = await self.redis.hgetall(SESSION_KEY.format(user_id=user_id))
+        session = {
+            "state": "chat",
+            "data": {},
+            "started_at": datetime.now(timezone.utc)
+        }
+        for field, value in fields.items():
+            if field.startswith(SESSION_DATA_PREFIX):
+                session["data"][field[len(SESSION_DATA_PREFIX):]] = orjson.loads(value)
             else:
-                # Handle general chat with AI
-                response = await self.ai_chatbot.generate_response(message_text)
-                await update.message.reply_text(response["message"])
+                session[field] = orjson.loads(value)
+        return session
 
-        except Exception as e:
-            logger.error(f"Error handling message: {str(e)}")
-            capture_exception(e)
-            await update.message.reply_text(
-                "Sorry, something went wrong. Please try again later."
+    async def _save_session(self, user_id: int, session: Dict[str, Any]) -> None:
+        """Replace a user's session in Redis, refreshing its expiry"""
+        key = SESSION_KEY.format(user_id=user_id)
+        fields = _session_fields(session["state"], session["data"])
+        fields["started_at"] = orjson.dumps(session["started_at"])
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.delete(key)
+            pipe.hset(key, mapping=fields)
+            pipe.expire(key, SESSION_TTL)
+            await pipe.execute()
+
+    async def _update_session(self, user_id: int, state: Optional[str] = None, **data: Any) -> None:
+        """Write only the given session fields, leaving fields set by other handlers intact"""
+        key = SESSION_KEY.format(user_id=user_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping=_session_fields(state, data))
+            pipe.hsetnx(key, "started_at", orjson.dumps(datetime.now(timezone.utc)))
+            pipe.expire(key, SESSION_TTL)
+            await pipe.execute()
+
+    async def _get_website_content(self, section: str) -> Dict[str, Any]:
+        """Generate website content for a section, caching it per business and section"""
+        key = f"{self._business_name}|{section}"
+        content = self._content_cache.get(key)
+        if content is None:
+            content = await self.content.generate_website_content(self._content_payloads[section])
+            # Don't cache failed generations so the next request retries
+            if content.get("success", True):
+                self._content_cache[key] = content
+        return content
+
+    @safe_handler
+    async def _handle_start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /start command"""
+        user_id = update.effective_user.id
+        
+        # Initialize user session while the welcome message is generated
+        _, welcome_content = await asyncio.gather(
+            self._save_session(user_id, {
+                "state": "welcome",
+                "data": {},
+                "started_at": datetime.now(timezone.utc)
+            }),
+            self._get_website_content("welcome")
+        )
+        
+        await update.message.reply_text(
+            welcome_content["hero"]["description"],
+            reply_markup=self._kb_welcome
+        )
+
+    @safe_handler
+    async def _handle_help(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /help command"""
+        await update.message.reply_text(HELP_MESSAGE)
+
+    @safe_handler
+    async def _handle_onboard(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /onboard command"""
+        user_id = update.effective_user.id
+        
+        # Initialize onboarding session
+        await self._save_session(user_id, {
+            "state": "onboarding_start",
+            "data": {"step": 0},
+            "started_at": datetime.now(timezone.utc)
+        })
+        
+        await update.message.reply_text(ONBOARDING_INTRO, reply_markup=self._kb_onboard)
+
+    @safe_handler
+    async def _handle_support(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /support command"""
+        user_id = update.effective_user.id
+        
+        # Initialize support session
+        await self._save_session(user_id, {
+            "state": "support",
+            "data": {
+                "issue_type": None,
+                "description": None
+            },
+            "started_at": datetime.now(timezone.utc)
+        })
+        
+        await update.message.reply_text(
+            "How can we help you today? Please select an option below:",
+            reply_markup=self._kb_support
+        )
+
+    @safe_handler
+    async def _handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle incoming messages"""
+        user_id = update.effective_user.id
+        message_text = update.message.text
+        
+        # Stop floods before they reach the AI chatbot
+        if await self._is_rate_limited(user_id):
+            await update.message.reply_text(RATE_LIMIT_MESSAGE)
+            return
+        
+        session = await self._load_session(user_id)
+        state = session["state"]
+        
+        if state == "onboarding_business_info":
+            # Handle business info collection
+            session["data"]["business_info"] = message_text
+            await self._proceed_onboarding(update, context, session)
+            await self._update_session(
+                user_id,
+                business_info=message_text,
+                step=session["data"]["step"]
             )
+        
+        elif state == "support_description":
+            # Handle support ticket description
+            session["data"]["description"] = message_text
+            await self._create_support_ticket(update, context, session)
+            await self._update_session(user_id, state=session["state"], description=message_text)
+        
+        else:
+            # Handle general chat with AI; the session is unchanged, so it
+            # is not written back over updates made while the AI responds
+            response = await self.ai_chatbot.generate_response(message_text)
+            await update.message.reply_text(response["message"])
 
+    @safe_handler
     async def _handle_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle callback queries"""
-        try:
-            query = update.callback_query
-            user_id = query.from_user.id
-            callback_data = query.data
-            
-            if callback_data.startswith("onboard_"):
-                await self._handle_onboarding_callback(update, context, user_id, callback_data)
-            
-            elif callback_data.startswith("support_"):
-                await self._handle_support_callback(update, context, user_id, callback_data)
-            
-            elif callback_data == "learn_more":
-                await self._send_learn_more_info(update, context, user_id)
-            
-            elif callback_data == "pricing":
-                await self._send_pricing_info(update, context, user_id)
-            
-            # Answer callback query
+        query = update.callback_query
+        user_id = query.from_user.id
+        callback_data = query.data
+        
+        handler = self._cb_exact.get(callback_data)
+        if handler is not None:
+            work = handler(update, context, user_id)
+        else:
+            prefix, sep, _ = callback_data.partition("_")
+            handler = self._cb_prefix.get(prefix + sep) if sep else None
+            work = handler(update, context, user_id, callback_data) if handler else None
+        
+        # Answer callback query while the handler runs
+        if work is None:
             await query.answer()
-
-        except Exception as e:
-            logger.error(f"Error handling callback: {str(e)}")
-            capture_exception(e)
-            await update.callback_query.message.reply_text(
-                "Sorry, something went wrong. Please try again later."
-            )
+        else:
+            await asyncio.gather(query.answer(), work)
 
     async def _handle_onboarding_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE,
                                         user_id: int, callback_data: str):
         """Handle onboarding-related callbacks"""
-        try:
-            session = self.user_sessions[user_id]
-            
-            if callback_data == "onboard_start":
-                # Start onboarding process
-                session["state"] = "onboarding_business_info"
-                await update.callback_query.message.reply_text(
-                    "Great! Let's start with your business information.\n\n"
-                    "Please tell us about your business (name, industry, size, etc.):"
-                )
-            
-            elif callback_data == "onboard_skip":
-                # Skip onboarding for now
-                session["state"] = "chat"
-                keyboard = [
-                    [InlineKeyboardButton("Start Onboarding", callback_data="onboard_start")]
-                ]
-                reply_markup = InlineKeyboardMarkup(keyboard)
-                
-                await update.callback_query.message.reply_text(
-                    "No problem! You can start the onboarding process anytime using /onboard",
-                    reply_markup=reply_markup
-                )
-
-        except Exception as e:
-            logger.error(f"Error handling onboarding callback: {str(e)}")
-            capture_exception(e)
-            raise
+        if callback_data == "onboard_start":
+            # Start onboarding process
+            await self._update_session(user_id, state="onboarding_business_info")
+            await update.callback_query.message.reply_text(
+                "Great! Let's start with your business information.\n\n"
+                "Please tell us about your business (name, industry, size, etc.):"
+            )
+        
+        elif callback_data == "onboard_skip":
+            # Skip onboarding for now
+            await self._update_session(user_id, state="chat")
+            await update.callback_query.message.reply_text(
+                "No problem! You can start the onboarding process anytime using /onboard",
+                reply_markup=self._kb_skip_onboard
+            )
 
     async def _handle_support_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE,
                                      user_id: int, callback_data: str):
         """Handle support-related callbacks"""
-        try:
-            session = self.user_sessions[user_id]
+        if callback_data.startswith("support_"):
+            # Set issue type and request description
+            issue_type = callback_data.replace("support_", "")
+            await self._update_session(user_id, state="support_description", issue_type=issue_type)
             
-            if callback_data.startswith("support_"):
-                # Set issue type and request description
-                issue_type = callback_data.replace("support_", "")
-                session["state"] = "support_description"
-                session["data"]["issue_type"] = issue_type
-                
-                await update.callback_query.message.reply_text(
-                    "Please describe your issue in detail:"
-                )
-
-        except Exception as e:
-            logger.error(f"Error handling support callback: {str(e)}")
-            capture_exception(e)
-            raise
+            await update.callback_query.message.reply_text(
+                "Please describe your issue in detail:"
+            )
 
     async def _proceed_onboarding(self, update: Update, context: ContextTypes.DEFAULT_TYPE,
-                                user_id: int):
+                                session: Dict[str, Any]):
         """Proceed with onboarding steps"""
-        try:
-            session = self.user_sessions[user_id]
-            step = session["data"]["step"]
-            
-            if step == 0:
-                # Business info collected, move to integrations
-                keyboard = [
-                    [
-                        InlineKeyboardButton("CRM Integration", callback_data="integrate_crm"),
-                        InlineKeyboardButton("Payment Setup", callback_data="integrate_payment")
-                    ],
-                    [InlineKeyboardButton("Skip Integrations", callback_data="integrate_skip")]
-                ]
-                reply_markup = InlineKeyboardMarkup(keyboard)
-                
-                session["data"]["step"] = 1
-                await update.message.reply_text(
-                    "Great! Now let's set up your integrations:",
-                    reply_markup=reply_markup
-                )
-            
-            elif step == 1:
-                # Integrations done, move to payment
-                keyboard = [
-                    [
-                        InlineKeyboardButton("Credit Card", callback_data="payment_card"),
-                        InlineKeyboardButton("Crypto", callback_data="payment_crypto")
-                    ]
-                ]
-                reply_markup = InlineKeyboardMarkup(keyboard)
-                
-                session["data"]["step"] = 2
-                await update.message.reply_text(
-                    "Almost done! Choose your preferred payment method:",
-                    reply_markup=reply_markup
-                )
-
-        except Exception as e:
-            logger.error(f"Error proceeding with onboarding: {str(e)}")
-            capture_exception(e)
-            raise
-
-    async def _create_support_ticket(self, update: Update, context: ContextTypes.DEFAULT_TYPE,
-                                   user_id: int):
-        """Create a support ticket"""
-        try:
-            session = self.user_sessions[user_id]
-            issue_type = session["data"]["issue_type"]
-            description = session["data"]["description"]
-            
-            # Create ticket in system
-            ticket_id = f"TICKET_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-            
-            # Reset session state
-            session["state"] = "chat"
-            
+        step = session["data"]["step"]
+        
+        if step == 0:
+            # Business info collected, move to integrations
+            session["data"]["step"] = 1
             await update.message.reply_text(
-                f"Thank you for contacting support! Your ticket ID is: {ticket_id}\n\n"
-                "Our team will get back to you shortly."
+                "Great! Now let's set up your integrations:",
+                reply_markup=self._kb_integrations
+            )
+        
+        elif step == 1:
+            # Integrations done, move to payment
+            session["data"]["step"] = 2
+            await update.message.reply_text(
+                "Almost done! Choose your preferred payment method:",
+                reply_markup=self._kb_payment_methods
             )
 
-        except Exception as e:
-            logger.error(f"Error creating support ticket: {str(e)}")
-            capture_exception(e)
-            raise
+    async def _create_support_ticket(self, update: Update, context: ContextTypes.DEFAULT_TYPE,
+                                   session: Dict[str, Any]):
+        """Create a support ticket"""
+        issue_type = session["data"]["issue_type"]
+        description = session["data"]["description"]
+        
+        # Create ticket in system
+        ticket_id = f"TICKET_{self._ticket_epoch}_{next(self._ticket_seq):08d}"
+        
+        # Reset session state
+        session["state"] = "chat"
+        
+        await update.message.reply_text(
+            f"Thank you for contacting support! Your ticket ID is: {ticket_id}\n\n"
+            "Our team will get back to you shortly."
+        )
 
     async def _send_learn_more_info(self, update: Update, context: ContextTypes.DEFAULT_TYPE,
                                    user_id: int):
         """Send learn more information"""
-        try:
-            # Generate learn more content
-            content = await self.content.generate_website_content({
-                "business_name": self.config["business"]["name"],
-                "value_proposition": self.config["business"]["value_prop"],
-                "section": "features"
-            })
-            
-            keyboard = [
-                [
-                    InlineKeyboardButton("Start Free Trial", callback_data="onboard_start"),
-                    InlineKeyboardButton("View Pricing", callback_data="pricing")
-                ]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            await update.callback_query.message.reply_text(
-                content["features"]["description"],
-                reply_markup=reply_markup
-            )
-
-        except Exception as e:
-            logger.error(f"Error sending learn more info: {str(e)}")
-            capture_exception(e)
-            raise
+        # Generate learn more content
+        content = await self._get_website_content("features")
+        
+        await update.callback_query.message.reply_text(
+            content["features"]["description"],
+            reply_markup=self._kb_learn_more
+        )
 
     async def _send_pricing_info(self, update: Update, context: ContextTypes.DEFAULT_TYPE,
                                 user_id: int):
         """Send pricing information"""
-        try:
-            # Get pricing information
-            pricing = {
-                "basic": {
-                    "name": "Basic",
-                    "price": "$29/month",
-                    "features": [
-                        "AI Chatbot",
-                        "Basic CRM Integration",
-                        "Email Support"
-                    ]
-                },
-                "pro": {
-                    "name": "Professional",
-                    "price": "$99/month",
-                    "features": [
-                        "Everything in Basic",
-                        "Advanced AI Features",
-                        "Priority Support"
-                    ]
-                },
-                "enterprise": {
-                    "name": "Enterprise",
-                    "price": "Custom",
-                    "features": [
-                        "Everything in Pro",
-                        "Custom Integrations",
-                        "Dedicated Support"
-                    ]
-                }
-            }
-            
-            # Format pricing message
-            message = "📊 Our Pricing Plans:\n\n"
-            for plan, details in pricing.items():
-                message += f"🔹 {details['name']} - {details['price']}\n"
-                for feature in details['features']:
-                    message += f"  ✓ {feature}\n"
-                message += "\n"
-            
-            keyboard = [
-                [InlineKeyboardButton("Start Free Trial", callback_data="onboard_start")]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            await update.callback_query.message.reply_text(
-                message,
-                reply_markup=reply_markup
-            )
-
-        except Exception as e:
-            logger.error(f"Error sending pricing info: {str(e)}")
-            capture_exception(e)
-            raise
+        await update.callback_query.message.reply_text(
+            PRICING_MESSAGE,
+            reply_markup=self._kb_pricing_cta
+        )
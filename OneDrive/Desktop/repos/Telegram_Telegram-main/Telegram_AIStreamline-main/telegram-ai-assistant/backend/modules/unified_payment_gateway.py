@@ -1,40 +1,190 @@
 import logging
-from typing import Dict, Any, List, Optional
+from typing import Deque, Dict, Any, List, Optional, Union
 import aiohttp
 import asyncio
-from datetime import datetime
-import json
+import time
+from bisect import bisect_left, bisect_right
+from collections import defaultdict, deque
+from itertools import islice
+from pathlib import Path
+import aiofiles
+from datetime import datetime, timedelta, timezone
 from decimal import Decimal
+from functools import cached_property
+from uuid import uuid4
+import orjson
+import pybreaker
+from tenacity import AsyncRetrying, retry_if_exception_type, stop_after_attempt, wait_exponential_jitter
 from sentry_config import capture_exception
+import requests
+from requests.adapters import HTTPAdapter
 import stripe
 from coinbase_commerce.client import Client as CoinbaseClient
 from bitpay.client import Client as BitPayClient
 
 logger = logging.getLogger(__name__)
 
+# Keep-alive connections to the Stripe API; sized to asyncio.to_thread's
+# default worker pool so every thread can hold a warm connection
+STRIPE_POOL_SIZE = 32
+
+DEFAULT_HISTORY_LIMIT = 10_000
+
+# Provider calls are retried on network errors and 5xx responses; each provider's
+# circuit opens after BREAKER_FAIL_MAX consecutive failures and fails fast for
+# BREAKER_RESET_TIMEOUT seconds
+PROVIDER_RETRY_ATTEMPTS = 3
+BREAKER_FAIL_MAX = 5
+BREAKER_RESET_TIMEOUT = 30
+TRANSIENT_ERRORS = (
+    stripe.error.APIConnectionError,
+    stripe.error.APIError,
+    requests.ConnectionError,
+    requests.Timeout
+)
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def _to_cents(amount: Any) -> int:
+    """Convert a major-unit amount (e.g. "19.99") to integer minor units"""
+    return int(Decimal(str(amount)) * 100)
+
+
+def _iso_to_ns(value: str) -> int:
+    """Convert an ISO 8601 date/time to epoch nanoseconds; naive values are local time"""
+    return (datetime.fromisoformat(value).astimezone() - _EPOCH) // timedelta(microseconds=1) * 1000
+
+
+def _load_payload(webhook_data: Union[Dict[str, Any], bytes, str]) -> Dict[str, Any]:
+    """Decode a raw webhook body; already parsed payloads are returned as is"""
+    if isinstance(webhook_data, (bytes, bytearray, memoryview, str)):
+        return orjson.loads(webhook_data)
+    return webhook_data
+
+
+def _fmt_ts(timestamp_ns: int) -> str:
+    """Format a nanosecond epoch timestamp as an ISO 8601 string"""
+    return datetime.fromtimestamp(timestamp_ns / 1e9, tz=timezone.utc).isoformat()
+
 class UnifiedPaymentGateway:
     def __init__(self, config: Dict[str, Any]):
         """Initialize unified payment gateway"""
         self.config = config
         self.payment_config = config["plugins"]["payment_gateway"]
         
-        # Initialize Stripe
-        stripe.api_key = self.payment_config["stripe"]["secret_key"]
+        # Initialize Stripe with one connection pool shared by all worker threads;
+        # Coinbase Commerce and BitPay clients are created on first use
+        self._stripe_session: Optional[requests.Session] = None
+        if "stripe" in self.payment_config:
+            stripe.api_key = self.payment_config["stripe"]["secret_key"]
+            self._stripe_session = requests.Session()
+            self._stripe_session.mount("https://", HTTPAdapter(pool_maxsize=STRIPE_POOL_SIZE))
+            stripe.default_http_client = stripe.RequestsClient(session=self._stripe_session)
         
-        # Initialize Coinbase Commerce
-        self.coinbase = CoinbaseClient(api_key=self.payment_config["coinbase"]["api_key"])
-        
-        # Initialize BitPay
-        self.bitpay = BitPayClient(
-            api_key=self.payment_config["bitpay"]["api_key"],
-            merchant_token=self.payment_config["bitpay"]["merchant_token"]
+        # Initialize transaction history as a ring buffer, indexed by transaction ID
+        # for webhook updates; evicted transactions are appended to a JSON-lines
+        # spill file by a background writer
+        self.transaction_history: Deque[Dict[str, Any]] = deque(
+            maxlen=self.payment_config.get("transaction_history_limit", DEFAULT_HISTORY_LIMIT)
         )
+        self._by_txid: Dict[str, Dict[str, Any]] = {}
+        # The spill file is runtime data, so it lives under the configured
+        # data_dir rather than next to the source
+        if "transaction_spill_path" in self.payment_config:
+            self._spill_path = Path(self.payment_config["transaction_spill_path"])
+        elif "data_dir" in self.payment_config:
+            self._spill_path = Path(self.payment_config["data_dir"]) / "transactions.jsonl"
+        else:
+            raise ValueError("Payment gateway config needs data_dir or transaction_spill_path")
+        self._spill_queue: asyncio.Queue = asyncio.Queue()
+        self._spill_task: Optional[asyncio.Task] = None
+        
+        # Secondary indexes for get_transaction_history: sequence numbers per
+        # payment method/provider, and each in-memory transaction's timestamp in
+        # time order; transaction_history[0] has sequence number _history_offset
+        self._history_offset = 0
+        self._positions: Dict[str, Dict[str, Deque[int]]] = {
+            "payment_method": defaultdict(deque),
+            "provider": defaultdict(deque)
+        }
+        self._timestamps: Deque[int] = deque()
         
-        # Initialize transaction history
-        self.transaction_history: List[Dict[str, Any]] = []
+        # Running totals for get_transaction_stats; these cover all recorded
+        # transactions, including ones evicted to the spill file
+        self._total_cents: Dict[str, int] = {}
+        self._by_method = {
+            "credit_card": 0,
+            "crypto": 0
+        }
+        self._by_status = {
+            "completed": 0,
+            "pending": 0,
+            "failed": 0
+        }
+        
+        # Circuit breakers per provider; declined cards and invalid requests are
+        # caller errors and do not count as provider failures
+        self._breakers = {
+            provider: pybreaker.CircuitBreaker(
+                fail_max=BREAKER_FAIL_MAX,
+                reset_timeout=BREAKER_RESET_TIMEOUT,
+                exclude=[stripe.error.CardError, stripe.error.InvalidRequestError],
+                name=provider
+            )
+            for provider in ("stripe", "coinbase", "bitpay")
+        }
+        
+        # Per-method/provider handlers; crypto payments are keyed by provider
+        self._create_dispatch = {
+            "credit_card": self._create_stripe_payment,
+            ("crypto", "coinbase"): self._create_coinbase_payment,
+            ("crypto", "bitpay"): self._create_bitpay_payment
+        }
+        self._webhook_dispatch = {
+            "stripe": self._handle_stripe_webhook,
+            "coinbase": self._handle_coinbase_webhook,
+            "bitpay": self._handle_bitpay_webhook
+        }
         
         logger.info("Unified Payment Gateway initialized")
 
+    @cached_property
+    def coinbase(self) -> CoinbaseClient:
+        """Coinbase Commerce client"""
+        return CoinbaseClient(api_key=self.payment_config["coinbase"]["api_key"])
+
+    @cached_property
+    def bitpay(self) -> BitPayClient:
+        """BitPay client"""
+        return BitPayClient(
+            api_key=self.payment_config["bitpay"]["api_key"],
+            merchant_token=self.payment_config["bitpay"]["merchant_token"]
+        )
+
+    async def close(self) -> None:
+        """Flush spilled transaction history and close the shared Stripe connection pool"""
+        try:
+            if self._spill_task and not self._spill_task.done():
+                await self._spill_queue.join()
+                self._spill_task.cancel()
+            if self._stripe_session is not None:
+                self._stripe_session.close()
+            
+        except Exception as e:
+            logger.error(f"Error closing payment gateway HTTP session: {str(e)}")
+
+    async def _call_provider(self, provider: str, func, *args, **kwargs) -> Any:
+        """Run a blocking provider SDK call off the event loop with retries and a circuit breaker"""
+        async for attempt in AsyncRetrying(
+            stop=stop_after_attempt(PROVIDER_RETRY_ATTEMPTS),
+            wait=wait_exponential_jitter(initial=0.1, max=2.0),
+            retry=retry_if_exception_type(TRANSIENT_ERRORS),
+            reraise=True
+        ):
+            with attempt:
+                return await asyncio.to_thread(self._breakers[provider].call, func, *args, **kwargs)
+
     async def create_payment(self, payment_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create payment based on selected method"""
         try:
@@ -42,18 +192,13 @@ class UnifiedPaymentGateway:
             amount = Decimal(payment_data["amount"])
             currency = payment_data.get("currency", "USD")
             
-            if method == "credit_card":
-                return await self._create_stripe_payment(payment_data)
-            elif method == "crypto":
-                crypto_provider = payment_data.get("crypto_provider", "coinbase")
-                if crypto_provider == "coinbase":
-                    return await self._create_coinbase_payment(payment_data)
-                elif crypto_provider == "bitpay":
-                    return await self._create_bitpay_payment(payment_data)
-                else:
-                    raise ValueError(f"Unsupported crypto provider: {crypto_provider}")
-            else:
+            key = ("crypto", payment_data.get("crypto_provider", "coinbase")) if method == "crypto" else method
+            handler = self._create_dispatch.get(key)
+            if handler is None:
+                if method == "crypto":
+                    raise ValueError(f"Unsupported crypto provider: {key[1]}")
                 raise ValueError(f"Unsupported payment method: {method}")
+            return await handler(payment_data)
 
         except Exception as e:
             logger.error(f"Error creating payment: {str(e)}")
@@ -66,24 +211,28 @@ class UnifiedPaymentGateway:
     async def _create_stripe_payment(self, payment_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create Stripe payment intent"""
         try:
-            amount = int(Decimal(payment_data["amount"]) * 100)  # Convert to cents
+            amount = _to_cents(payment_data["amount"])
             currency = payment_data.get("currency", "USD").lower()
             
-            intent = stripe.PaymentIntent.create(
+            # Create payment intent; the idempotency key makes retries safe
+            intent = await self._call_provider(
+                "stripe",
+                stripe.PaymentIntent.create,
                 amount=amount,
                 currency=currency,
                 payment_method_types=["card"],
                 metadata={
                     "order_id": payment_data.get("order_id"),
                     "customer_id": payment_data.get("customer_id")
-                }
+                },
+                idempotency_key=str(uuid4())
             )
             
             # Record transaction
             self._record_transaction(
                 payment_method="credit_card",
                 provider="stripe",
-                amount=payment_data["amount"],
+                amount_cents=amount,
                 currency=currency,
                 status="pending",
                 transaction_id=intent.id
@@ -106,7 +255,9 @@ class UnifiedPaymentGateway:
     async def _create_coinbase_payment(self, payment_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create Coinbase Commerce payment"""
         try:
-            charge = self.coinbase.charge.create(
+            charge = await self._call_provider(
+                "coinbase",
+                self.coinbase.charge.create,
                 name=payment_data.get("description", "Payment"),
                 description=payment_data.get("description", "Payment"),
                 pricing_type="fixed_price",
@@ -124,7 +275,7 @@ class UnifiedPaymentGateway:
             self._record_transaction(
                 payment_method="crypto",
                 provider="coinbase",
-                amount=payment_data["amount"],
+                amount_cents=_to_cents(payment_data["amount"]),
                 currency=payment_data.get("currency", "USD"),
                 status="pending",
                 transaction_id=charge.id
@@ -148,7 +299,7 @@ class UnifiedPaymentGateway:
     async def _create_bitpay_payment(self, payment_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create BitPay invoice"""
         try:
-            invoice = self.bitpay.create_invoice({
+            invoice = await self._call_provider("bitpay", self.bitpay.create_invoice, {
                 "price": float(payment_data["amount"]),
                 "currency": payment_data.get("currency", "USD"),
                 "orderId": payment_data.get("order_id"),
@@ -163,7 +314,7 @@ class UnifiedPaymentGateway:
             self._record_transaction(
                 payment_method="crypto",
                 provider="bitpay",
-                amount=payment_data["amount"],
+                amount_cents=_to_cents(payment_data["amount"]),
                 currency=payment_data.get("currency", "USD"),
                 status="pending",
                 transaction_id=invoice["id"]
@@ -184,17 +335,18 @@ class UnifiedPaymentGateway:
                 "error": str(e)
             }
 
-    async def handle_webhook(self, provider: str, webhook_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Handle payment webhook from various providers"""
+    async def handle_webhook(self, provider: str, webhook_data: Union[Dict[str, Any], bytes, str],
+                           signature: Optional[str] = None) -> Dict[str, Any]:
+        """Handle payment webhook from various providers
+
+        Bodies may be passed raw or already parsed; Stripe webhooks need the raw
+        request body and its Stripe-Signature header
+        """
         try:
-            if provider == "stripe":
-                return await self._handle_stripe_webhook(webhook_data)
-            elif provider == "coinbase":
-                return await self._handle_coinbase_webhook(webhook_data)
-            elif provider == "bitpay":
-                return await self._handle_bitpay_webhook(webhook_data)
-            else:
+            handler = self._webhook_dispatch.get(provider)
+            if handler is None:
                 raise ValueError(f"Unsupported webhook provider: {provider}")
+            return await handler(webhook_data, signature)
 
         except Exception as e:
             logger.error(f"Error handling webhook: {str(e)}")
@@ -204,29 +356,38 @@ class UnifiedPaymentGateway:
                 "error": str(e)
             }
 
-    async def _handle_stripe_webhook(self, webhook_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Handle Stripe webhook"""
+    async def _handle_stripe_webhook(self, payload: Union[bytes, str], signature: Optional[str]) -> Dict[str, Any]:
+        """Verify and handle Stripe webhook"""
         try:
-            event = stripe.Event.construct_from(webhook_data, stripe.api_key)
+            event = stripe.Webhook.construct_event(
+                payload, signature, self.payment_config["stripe"]["webhook_secret"]
+            )
+            event_type = event["type"]
             
-            if event.type == "payment_intent.succeeded":
-                payment_intent = event.data.object
+            if event_type == "payment_intent.succeeded":
+                payment_intent = event["data"]["object"]
                 self._update_transaction_status(
-                    transaction_id=payment_intent.id,
+                    transaction_id=payment_intent["id"],
                     new_status="completed"
                 )
                 return {"success": True, "status": "completed"}
                 
-            elif event.type == "payment_intent.payment_failed":
-                payment_intent = event.data.object
+            elif event_type == "payment_intent.payment_failed":
+                payment_intent = event["data"]["object"]
                 self._update_transaction_status(
-                    transaction_id=payment_intent.id,
+                    transaction_id=payment_intent["id"],
                     new_status="failed"
                 )
                 return {"success": True, "status": "failed"}
             
             return {"success": True, "status": "unhandled"}
 
+        except stripe.error.SignatureVerificationError as e:
+            logger.warning(f"Rejected Stripe webhook with invalid signature: {str(e)}")
+            return {
+                "success": False,
+                "error": "Invalid signature"
+            }
         except Exception as e:
             logger.error(f"Error handling Stripe webhook: {str(e)}")
             capture_exception(e)
@@ -235,10 +396,11 @@ class UnifiedPaymentGateway:
                 "error": str(e)
             }
 
-    async def _handle_coinbase_webhook(self, webhook_data: Dict[str, Any]) -> Dict[str, Any]:
+    async def _handle_coinbase_webhook(self, webhook_data: Union[Dict[str, Any], bytes, str],
+                                    signature: Optional[str] = None) -> Dict[str, Any]:
         """Handle Coinbase Commerce webhook"""
         try:
-            event = webhook_data["event"]
+            event = _load_payload(webhook_data)["event"]
             
             if event["type"] == "charge:confirmed":
                 charge = event["data"]
@@ -266,9 +428,11 @@ class UnifiedPaymentGateway:
                 "error": str(e)
             }
 
-    async def _handle_bitpay_webhook(self, webhook_data: Dict[str, Any]) -> Dict[str, Any]:
+    async def _handle_bitpay_webhook(self, webhook_data: Union[Dict[str, Any], bytes, str],
+                                  signature: Optional[str] = None) -> Dict[str, Any]:
         """Handle BitPay webhook"""
         try:
+            webhook_data = _load_payload(webhook_data)
             if webhook_data["status"] == "confirmed":
                 self._update_transaction_status(
                     transaction_id=webhook_data["id"],
@@ -293,47 +457,159 @@ class UnifiedPaymentGateway:
                 "error": str(e)
             }
 
-    def _record_transaction(self, payment_method: str, provider: str, amount: Decimal,
+    def _record_transaction(self, payment_method: str, provider: str, amount_cents: int,
                           currency: str, status: str, transaction_id: str) -> None:
         """Record payment transaction"""
-        self.transaction_history.append({
-            "timestamp": datetime.now().isoformat(),
+        if len(self.transaction_history) == self.transaction_history.maxlen:
+            self._evict_oldest_transaction()
+        
+        now = time.time_ns()
+        transaction = {
+            "timestamp_ns": now,
             "payment_method": payment_method,
             "provider": provider,
-            "amount": str(amount),
+            "amount_cents": amount_cents,
             "currency": currency,
             "status": status,
             "transaction_id": transaction_id
-        })
+        }
+        position = self._history_offset + len(self.transaction_history)
+        self.transaction_history.append(transaction)
+        self._by_txid[transaction_id] = transaction
+        
+        self._positions["payment_method"][payment_method].append(position)
+        self._positions["provider"][provider].append(position)
+        # Clamp if the wall clock steps back so the index stays sorted for bisect
+        self._timestamps.append(max(now, self._timestamps[-1]) if self._timestamps else now)
+        
+        self._total_cents[currency] = self._total_cents.get(currency, 0) + amount_cents
+        self._by_method[payment_method] += 1
+        self._by_status[status] += 1
+
+    def _evict_oldest_transaction(self) -> None:
+        """Drop the oldest transaction from memory and hand it to the spill writer"""
+        oldest = self.transaction_history.popleft()
+        self._history_offset += 1
+        self._timestamps.popleft()
+        
+        # The oldest transaction is also the oldest entry in each of its indexes
+        for field, index in self._positions.items():
+            positions = index[oldest[field]]
+            positions.popleft()
+            if not positions:
+                del index[oldest[field]]
+        if self._by_txid.get(oldest["transaction_id"]) is oldest:
+            del self._by_txid[oldest["transaction_id"]]
+        
+        self._spill_queue.put_nowait(oldest)
+        try:
+            if self._spill_task is None or self._spill_task.done():
+                self._spill_task = asyncio.get_running_loop().create_task(self._spill_writer())
+        except RuntimeError:
+            # No running event loop; write the backlog synchronously instead
+            self._spill_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self._spill_path, "ab") as f:
+                while not self._spill_queue.empty():
+                    f.write(orjson.dumps(self._spill_queue.get_nowait()) + b"\n")
+                    self._spill_queue.task_done()
+
+    async def _spill_writer(self) -> None:
+        """Append evicted transactions to the spill file as JSON lines"""
+        try:
+            self._spill_path.parent.mkdir(parents=True, exist_ok=True)
+            async with aiofiles.open(self._spill_path, "ab") as f:
+                while True:
+                    batch = [await self._spill_queue.get()]
+                    while not self._spill_queue.empty():
+                        batch.append(self._spill_queue.get_nowait())
+                    try:
+                        await f.write(b"".join(orjson.dumps(t) + b"\n" for t in batch))
+                        await f.flush()
+                    finally:
+                        for _ in batch:
+                            self._spill_queue.task_done()
+                            
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error spilling transaction history: {str(e)}")
+            capture_exception(e)
+
+    def _read_spilled_transactions(self, filters: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Read spilled transactions matching the filters, oldest first"""
+        if not self._spill_path.exists():
+            return []
+        
+        start = _iso_to_ns(filters["start_date"]) if "start_date" in filters else None
+        end = _iso_to_ns(filters["end_date"]) if "end_date" in filters else None
+        checks = [(field, filters[field]) for field in ("payment_method", "provider", "status") if field in filters]
+        
+        transactions = []
+        with open(self._spill_path, "rb") as f:
+            for line in f:
+                transaction = orjson.loads(line)
+                if start is not None and transaction["timestamp_ns"] < start:
+                    continue
+                if end is not None and transaction["timestamp_ns"] > end:
+                    continue
+                if all(transaction[field] == value for field, value in checks):
+                    transactions.append(transaction)
+        return transactions
 
     def _update_transaction_status(self, transaction_id: str, new_status: str) -> None:
         """Update transaction status"""
-        for transaction in self.transaction_history:
-            if transaction["transaction_id"] == transaction_id:
-                transaction["status"] = new_status
-                transaction["updated_at"] = datetime.now().isoformat()
-                break
+        transaction = self._by_txid.get(transaction_id)
+        if transaction is not None:
+            self._by_status[transaction["status"]] -= 1
+            self._by_status[new_status] += 1
+            transaction["status"] = new_status
+            transaction["updated_at_ns"] = time.time_ns()
+
+    @staticmethod
+    def _format_transaction(transaction: Dict[str, Any]) -> Dict[str, Any]:
+        """Add formatted timestamps to a transaction record for output"""
+        formatted = {**transaction, "timestamp": _fmt_ts(transaction["timestamp_ns"])}
+        if "updated_at_ns" in transaction:
+            formatted["updated_at"] = _fmt_ts(transaction["updated_at_ns"])
+        return formatted
 
     async def get_transaction_history(self, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
         """Get transaction history with optional filters"""
         try:
             history = self.transaction_history
+            offset = self._history_offset
+            
+            # Older transactions live in the spill file; read them when the
+            # requested range may reach past the in-memory window
+            older = []
+            if offset and not (filters and "start_date" in filters
+                               and self._timestamps and _iso_to_ns(filters["start_date"]) > self._timestamps[0]):
+                await self._spill_queue.join()
+                older = await asyncio.to_thread(self._read_spilled_transactions, filters or {})
+            
+            if not filters:
+                return [self._format_transaction(t) for t in older] + [self._format_transaction(t) for t in history]
             
-            if filters:
-                if "payment_method" in filters:
-                    history = [t for t in history if t["payment_method"] == filters["payment_method"]]
-                if "provider" in filters:
-                    history = [t for t in history if t["provider"] == filters["provider"]]
-                if "status" in filters:
-                    history = [t for t in history if t["status"] == filters["status"]]
-                if "start_date" in filters:
-                    start = datetime.fromisoformat(filters["start_date"])
-                    history = [t for t in history if datetime.fromisoformat(t["timestamp"]) >= start]
-                if "end_date" in filters:
-                    end = datetime.fromisoformat(filters["end_date"])
-                    history = [t for t in history if datetime.fromisoformat(t["timestamp"]) <= end]
+            # Narrow to the date range by bisecting the timestamp index
+            lo, hi = 0, len(history)
+            if "start_date" in filters:
+                lo = bisect_left(self._timestamps, _iso_to_ns(filters["start_date"]))
+            if "end_date" in filters:
+                hi = bisect_right(self._timestamps, _iso_to_ns(filters["end_date"]))
             
-            return history
+            # Start from the smallest matching field index, then check the rest per entry
+            indexed = [index.get(filters[field], []) for field, index in self._positions.items() if field in filters]
+            if indexed:
+                positions = min(indexed, key=len)
+                positions = islice(positions, bisect_left(positions, lo + offset), bisect_left(positions, hi + offset))
+            else:
+                positions = range(lo + offset, hi + offset)
+            
+            checks = [(field, filters[field]) for field in ("payment_method", "provider", "status") if field in filters]
+            return [self._format_transaction(t) for t in older] + [
+                self._format_transaction(transaction) for transaction in (history[i - offset] for i in positions)
+                if all(transaction[field] == value for field, value in checks)
+            ]
 
         except Exception as e:
             logger.error(f"Error getting transaction history: {str(e)}")
@@ -343,36 +619,14 @@ class UnifiedPaymentGateway:
     async def get_transaction_stats(self) -> Dict[str, Any]:
         """Get transaction statistics"""
         try:
-            stats = {
-                "total_transactions": len(self.transaction_history),
-                "total_amount": {},
-                "by_payment_method": {
-                    "credit_card": 0,
-                    "crypto": 0
+            return {
+                "total_transactions": self._history_offset + len(self.transaction_history),
+                "total_amount": {
+                    currency: Decimal(cents).scaleb(-2) for currency, cents in self._total_cents.items()
                 },
-                "by_status": {
-                    "completed": 0,
-                    "pending": 0,
-                    "failed": 0
-                }
+                "by_payment_method": dict(self._by_method),
+                "by_status": dict(self._by_status)
             }
-            
-            for transaction in self.transaction_history:
-                # Update total amount by currency
-                currency = transaction["currency"]
-                amount = Decimal(transaction["amount"])
-                if currency not in stats["total_amount"]:
-                    stats["total_amount"][currency] = amount
-                else:
-                    stats["total_amount"][currency] += amount
-                
-                # Update payment method counts
-                stats["by_payment_method"][transaction["payment_method"]] += 1
-                
-                # Update status counts
-                stats["by_status"][transaction["status"]] += 1
-            
-            return stats
 
         except Exception as e:
             logger.error(f"Error getting transaction stats: {str(e)}")
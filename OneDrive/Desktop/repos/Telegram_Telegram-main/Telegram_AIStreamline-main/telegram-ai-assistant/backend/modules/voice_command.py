@@ -1,22 +1,32 @@
 import logging
-import tempfile
-import os
 from typing import Dict, Any, Optional
-from pathlib import Path
+import ahocorasick
 from google.cloud import speech
 from google.cloud.speech_v1 import RecognitionConfig
 import aiohttp
 import asyncio
-from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+HTTP_CONNECTION_LIMIT = 100
+HTTP_CONNECTION_LIMIT_PER_HOST = 20
+HTTP_KEEPALIVE_TIMEOUT = 30
+
+# Google's synchronous recognize only accepts up to a minute of audio; clips
+# this small are under a minute even at low Opus voice bitrates (~12 kbps)
+SYNC_RECOGNIZE_MAX_BYTES = 90 * 1024
+
 class VoiceCommand:
-    def __init__(self, config: Dict[str, Any]):
+    def __init__(self, config: Dict[str, Any], session: Optional[aiohttp.ClientSession] = None):
         """Initialize voice command processor with configuration"""
         self.config = config
         self.stt_config = config["plugins"]["voice_command"]["speech_to_text"]
         
+        # Shared HTTP session for voice downloads; created on first use unless one is passed in
+        self._http = session
+        self._owns_http = session is None
+        self._http_lock = asyncio.Lock()
+        
         # Initialize Google Cloud Speech client
         if self.stt_config["provider"] == "google":
             self.speech_client = speech.SpeechClient.from_service_account_info({
@@ -31,6 +41,13 @@ class VoiceCommand:
                 "auth_provider_x509_cert_url": "https://www.googleapis.com/oauth2/v1/certs",
                 "client_x509_cert_url": self.stt_config.get("client_x509_cert_url")
             })
+            self.recognition_config = speech.RecognitionConfig(
+                encoding=speech.RecognitionConfig.AudioEncoding.OGG_OPUS,
+                sample_rate_hertz=16000,
+                language_code="en-US",
+                model="default",
+                enable_automatic_punctuation=True
+            )
         
         # Command patterns for natural language processing
         self.command_patterns = {
@@ -52,23 +69,30 @@ class VoiceCommand:
             }
         }
         
+        # Single-pass keyword matcher; each keyword maps to its command's
+        # position in command_patterns so earlier commands keep priority;
+        # keywords are lowercased once here to match the lowercased text
+        self._keyword_automaton = ahocorasick.Automaton()
+        for priority, (command_type, pattern) in enumerate(self.command_patterns.items()):
+            for keyword in map(str.lower, pattern["keywords"]):
+                if keyword not in self._keyword_automaton:
+                    self._keyword_automaton.add_word(keyword, (priority, command_type))
+        self._keyword_automaton.make_automaton()
+        
         logger.info("Voice Command processor initialized successfully")
 
     async def process_voice_message(self, voice_file: Any) -> Dict[str, Any]:
         """Process a voice message and return the command response"""
         try:
-            # Download and convert voice message
-            voice_path = await self._download_voice_file(voice_file)
+            # Download voice message
+            content = await self._download_voice_file(voice_file)
             
             # Convert speech to text
-            text = await self._convert_speech_to_text(voice_path)
+            text = await self._convert_speech_to_text(content)
             
             # Process the command
             response = await self._process_command(text)
             
-            # Cleanup temporary files
-            self._cleanup_temp_files(voice_path)
-            
             return {
                 "success": True,
                 "text": text,
@@ -82,42 +106,50 @@ class VoiceCommand:
                 "error": str(e)
             }
 
-    async def _download_voice_file(self, voice_file: Any) -> Path:
-        """Download voice file to temporary location"""
+    async def _download_voice_file(self, voice_file: Any) -> bytes:
+        """Download voice file into memory"""
         try:
-            # Create temporary directory if it doesn't exist
-            temp_dir = Path("temp")
-            temp_dir.mkdir(exist_ok=True)
-            
-            # Generate unique filename
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            temp_path = temp_dir / f"voice_{timestamp}.ogg"
-            
-            # Download file using aiohttp
-            async with aiohttp.ClientSession() as session:
-                file_url = await voice_file.get_url()
-                async with session.get(file_url) as response:
-                    if response.status == 200:
-                        with open(temp_path, 'wb') as f:
-                            while True:
-                                chunk = await response.content.read(8192)
-                                if not chunk:
-                                    break
-                                f.write(chunk)
-            
-            return temp_path
+            session = await self._ensure_session()
+            file_url = await voice_file.get_url()
+            async with session.get(file_url) as response:
+                response.raise_for_status()
+                return await response.read()
             
         except Exception as e:
             logger.error(f"Error downloading voice file: {str(e)}")
             raise
 
-    async def _convert_speech_to_text(self, voice_path: Path) -> str:
+    async def _ensure_session(self) -> aiohttp.ClientSession:
+        """Return the shared HTTP session, creating it on first use"""
+        if self._owns_http and (self._http is None or self._http.closed):
+            async with self._http_lock:
+                if self._http is None or self._http.closed:
+                    self._http = aiohttp.ClientSession(
+                        connector=aiohttp.TCPConnector(
+                            limit=HTTP_CONNECTION_LIMIT,
+                            limit_per_host=HTTP_CONNECTION_LIMIT_PER_HOST,
+                            keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+                            enable_cleanup_closed=True
+                        )
+                    )
+        return self._http
+
+    async def close(self) -> None:
+        """Close the shared HTTP session if this processor created it"""
+        try:
+            if self._owns_http and self._http is not None and not self._http.closed:
+                await self._http.close()
+                
+        except Exception as e:
+            logger.error(f"Error closing voice command HTTP session: {str(e)}")
+
+    async def _convert_speech_to_text(self, content: bytes) -> str:
         """Convert speech to text using configured provider"""
         try:
             provider = self.stt_config["provider"]
             
             if provider == "google":
-                return await self._google_speech_to_text(voice_path)
+                return await self._google_speech_to_text(content)
             else:
                 raise ValueError(f"Unsupported STT provider: {provider}")
                 
@@ -125,26 +157,21 @@ class VoiceCommand:
             logger.error(f"Error in speech-to-text conversion: {str(e)}")
             raise
 
-    async def _google_speech_to_text(self, voice_path: Path) -> str:
+    async def _google_speech_to_text(self, content: bytes) -> str:
         """Convert speech to text using Google Speech-to-Text"""
         try:
-            # Read the audio file
-            with open(voice_path, "rb") as audio_file:
-                content = audio_file.read()
-            
-            # Configure audio and recognition settings
             audio = speech.RecognitionAudio(content=content)
-            config = speech.RecognitionConfig(
-                encoding=speech.RecognitionConfig.AudioEncoding.OGG_OPUS,
-                sample_rate_hertz=16000,
-                language_code="en-US",
-                model="default",
-                enable_automatic_punctuation=True
-            )
+            config = self.recognition_config
             
-            # Perform the transcription
-            operation = self.speech_client.long_running_recognize(config=config, audio=audio)
-            response = operation.result(timeout=90)
+            # Perform the transcription off the event loop; the client is blocking.
+            # Short clips skip the long-running operation and its polling
+            if len(content) <= SYNC_RECOGNIZE_MAX_BYTES:
+                response = await asyncio.to_thread(self.speech_client.recognize, config=config, audio=audio)
+            else:
+                operation = await asyncio.to_thread(
+                    self.speech_client.long_running_recognize, config=config, audio=audio
+                )
+                response = await asyncio.to_thread(operation.result, timeout=90)
             
             # Extract the transcribed text
             transcript = ""
@@ -162,9 +189,9 @@ class VoiceCommand:
         text = text.lower()
         
         # Find matching command pattern
-        for command_type, pattern in self.command_patterns.items():
-            if any(keyword in text for keyword in pattern["keywords"]):
-                return await pattern["handler"](text)
+        match = min((value for _, value in self._keyword_automaton.iter(text)), default=None)
+        if match is not None:
+            return await self.command_patterns[match[1]]["handler"](text)
         
         return "I'm sorry, I couldn't recognize a specific command. Please try again with a clearer instruction."
 
@@ -221,14 +248,6 @@ class VoiceCommand:
             
         return f"I'll help you {actions[action]} in the CRM system"
 
-    def _cleanup_temp_files(self, voice_path: Path) -> None:
-        """Clean up temporary files"""
-        try:
-            if voice_path.exists():
-                voice_path.unlink()
-        except Exception as e:
-            logger.error(f"Error cleaning up temporary files: {str(e)}")
-
     async def get_supported_commands(self) -> list:
         """Get list of supported voice commands"""
         return [
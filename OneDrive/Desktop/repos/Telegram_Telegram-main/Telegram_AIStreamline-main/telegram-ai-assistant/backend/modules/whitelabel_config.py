@@ -1,8 +1,12 @@
 import logging
-from typing import Dict, Any, Optional, List
-import json
+import os
+import tempfile
+from collections import defaultdict, deque
+from typing import Deque, Dict, Any, Optional, List
 from pathlib import Path
-import aiofiles
+import aiohttp
+import msgspec
+import orjson
 import asyncio
 from datetime import datetime
 import hashlib
@@ -10,6 +14,76 @@ from sentry_config import capture_exception
 
 logger = logging.getLogger(__name__)
 
+# Client configs are stored as MessagePack; JSON files written by earlier
+# versions are migrated on first load
+_ENC = msgspec.msgpack.Encoder()
+_DEC = msgspec.msgpack.Decoder(dict)
+
+# Webhook notifications are sent concurrently over one pooled session that
+# keeps connections and DNS lookups warm between config changes
+WEBHOOK_CONNECTION_LIMIT = 20
+WEBHOOK_KEEPALIVE_TIMEOUT = 60
+WEBHOOK_DNS_CACHE_TTL = 300
+WEBHOOK_TIMEOUT = 10
+
+DEFAULT_CHANGE_HISTORY_LIMIT = 1000
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    """Write data via a temporary file in the same directory so readers never see a partial file"""
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _append_line(path: Path, line: bytes) -> None:
+    """Append one line to a log file"""
+    with open(path, "ab") as f:
+        f.write(line)
+
+
+# Schema for validate_config; defaults match create_default_config. Features
+# and integrations are open-ended maps since clients can add their own.
+class Branding(msgspec.Struct):
+    company_name: str
+    primary_color: str
+    logo_url: str = ""
+    favicon_url: str = ""
+    secondary_color: str = ""
+    accent_color: str = ""
+    font_family: str = ""
+    custom_css: str = ""
+
+
+class Customization(msgspec.Struct):
+    telegram_bot_name: str = ""
+    welcome_message: str = ""
+    email_signature: str = ""
+    custom_commands: List[Any] = []
+
+
+class Security(msgspec.Struct):
+    require_authentication: bool
+    allowed_domains: List[str] = []
+    api_rate_limit: int = 100
+
+
+class ClientConfig(msgspec.Struct):
+    branding: Branding
+    features: Dict[str, bool]
+    integrations: Dict[str, Dict[str, Any]]
+    customization: Customization
+    security: Security
+    client_id: str = ""
+    created_at: str = ""
+    updated_at: str = ""
+
+
 class WhitelabelConfig:
     def __init__(self, config: Dict[str, Any]):
         """Initialize whitelabel configuration manager"""
@@ -18,14 +92,35 @@ class WhitelabelConfig:
         self.clients_dir = Path(self.whitelabel_config["clients_dir"])
         self.clients_dir.mkdir(parents=True, exist_ok=True)
         
-        # Cache for client configurations
+        # Cache for client configurations, plus their stored encoding for
+        # callers that only pass the bytes on
         self.client_cache: Dict[str, Dict[str, Any]] = {}
+        self.client_bytes_cache: Dict[str, bytes] = {}
         
-        # Configuration change history
-        self.change_history: List[Dict[str, Any]] = []
+        # Configuration change history; recent changes are kept in memory,
+        # overall and per client, and every change is also appended to a
+        # JSON-lines change log
+        self.change_history: Deque[Dict[str, Any]] = deque(
+            maxlen=self.whitelabel_config.get("change_history_limit", DEFAULT_CHANGE_HISTORY_LIMIT)
+        )
+        self._changes_by_client: Dict[str, Deque[Dict[str, Any]]] = defaultdict(deque)
+        self.change_log_path = Path(self.whitelabel_config.get(
+            "change_log_path", self.clients_dir / "changes.jsonl"
+        ))
         
         # Initialize webhook handlers
         self.webhook_handlers: List[Dict[str, Any]] = []
+        self._http: Optional[aiohttp.ClientSession] = None
+        self._http_lock = asyncio.Lock()
+        
+        # Preload stored client configs in the background when created inside
+        # a running event loop; otherwise callers can await warm_cache()
+        self._warm_task: Optional[asyncio.Task] = None
+        if self.whitelabel_config.get("preload_clients", True):
+            try:
+                self._warm_task = asyncio.get_running_loop().create_task(self.warm_cache())
+            except RuntimeError:
+                pass
         
         logger.info("Whitelabel Configuration Manager initialized")
 
@@ -36,20 +131,59 @@ class WhitelabelConfig:
             if client_id in self.client_cache:
                 return self.client_cache[client_id]
             
-            config_path = self.clients_dir / f"{client_id}.json"
-            if not config_path.exists():
-                return await self.create_default_config(client_id)
+            config_path = self.clients_dir / f"{client_id}.msgpack"
+            if config_path.exists():
+                data = await asyncio.to_thread(config_path.read_bytes)
+                config = _DEC.decode(data)
+                self.client_bytes_cache[client_id] = data
+            else:
+                legacy_path = self.clients_dir / f"{client_id}.json"
+                if not legacy_path.exists():
+                    return await self.create_default_config(client_id)
+                
+                config = orjson.loads(await asyncio.to_thread(legacy_path.read_bytes))
+                await self._write_config(client_id, config)
+                legacy_path.unlink()
             
-            async with aiofiles.open(config_path, 'r') as f:
-                config = json.loads(await f.read())
-                self.client_cache[client_id] = config
-                return config
+            self.client_cache[client_id] = config
+            return config
                 
         except Exception as e:
             logger.error(f"Error loading client config: {str(e)}")
             capture_exception(e)
             return await self.create_default_config(client_id)
 
+    async def warm_cache(self) -> int:
+        """Load all stored client configurations into the cache"""
+        try:
+            paths = [p for p in self.clients_dir.glob("*.msgpack") if p.stem not in self.client_cache]
+            contents = await asyncio.gather(
+                *(asyncio.to_thread(p.read_bytes) for p in paths),
+                return_exceptions=True
+            )
+            
+            loaded = 0
+            for path, data in zip(paths, contents):
+                # Configs loaded or saved while reading are newer; keep them
+                if path.stem in self.client_cache:
+                    continue
+                try:
+                    if isinstance(data, BaseException):
+                        raise data
+                    self.client_cache[path.stem] = _DEC.decode(data)
+                    self.client_bytes_cache[path.stem] = data
+                    loaded += 1
+                except Exception as e:
+                    logger.warning(f"Skipping client config {path.name}: {str(e)}")
+            
+            logger.info(f"Preloaded {loaded} client configurations")
+            return loaded
+            
+        except Exception as e:
+            logger.error(f"Error preloading client configs: {str(e)}")
+            capture_exception(e)
+            return 0
+
     async def create_default_config(self, client_id: str) -> Dict[str, Any]:
         """Create default client configuration"""
         try:
@@ -120,15 +254,13 @@ class WhitelabelConfig:
         try:
             config["updated_at"] = datetime.now().isoformat()
             
-            config_path = self.clients_dir / f"{client_id}.json"
-            async with aiofiles.open(config_path, 'w') as f:
-                await f.write(json.dumps(config, indent=2))
+            await self._write_config(client_id, config)
             
             # Update cache
             self.client_cache[client_id] = config
             
             # Record change
-            self._record_change(client_id, "update_config")
+            await self._record_change(client_id, "update_config")
             
             # Notify webhooks
             await self._notify_webhooks(client_id, "config_updated", config)
@@ -140,6 +272,24 @@ class WhitelabelConfig:
             capture_exception(e)
             raise
 
+    async def _write_config(self, client_id: str, config: Dict[str, Any]) -> None:
+        """Write client configuration to disk"""
+        data = _ENC.encode(config)
+        await asyncio.to_thread(_write_atomic, self.clients_dir / f"{client_id}.msgpack", data)
+        self.client_bytes_cache[client_id] = data
+
+    async def get_raw_config(self, client_id: str) -> bytes:
+        """Get client configuration as stored MessagePack bytes"""
+        try:
+            if client_id not in self.client_bytes_cache:
+                await self.load_client_config(client_id)
+            return self.client_bytes_cache[client_id]
+            
+        except Exception as e:
+            logger.error(f"Error getting raw client config: {str(e)}")
+            capture_exception(e)
+            raise
+
     async def update_branding(self, client_id: str, branding_data: Dict[str, Any]) -> Dict[str, Any]:
         """Update client branding configuration"""
         try:
@@ -196,7 +346,7 @@ class WhitelabelConfig:
     async def register_webhook(self, url: str, events: List[str]) -> str:
         """Register webhook for configuration changes"""
         try:
-            webhook_id = hashlib.md5(f"{url}_{','.join(events)}".encode()).hexdigest()
+            webhook_id = hashlib.blake2b(f"{url}_{','.join(events)}".encode(), digest_size=16).hexdigest()
             
             self.webhook_handlers.append({
                 "id": webhook_id,
@@ -223,69 +373,104 @@ class WhitelabelConfig:
             capture_exception(e)
             return False
 
+    async def _ensure_session(self) -> aiohttp.ClientSession:
+        """Return the shared webhook HTTP session, creating it on first use"""
+        if self._http is None or self._http.closed:
+            async with self._http_lock:
+                if self._http is None or self._http.closed:
+                    self._http = aiohttp.ClientSession(
+                        connector=aiohttp.TCPConnector(
+                            limit=WEBHOOK_CONNECTION_LIMIT,
+                            keepalive_timeout=WEBHOOK_KEEPALIVE_TIMEOUT,
+                            ttl_dns_cache=WEBHOOK_DNS_CACHE_TTL
+                        ),
+                        timeout=aiohttp.ClientTimeout(total=WEBHOOK_TIMEOUT)
+                    )
+        return self._http
+
+    async def close(self) -> None:
+        """Close the shared webhook HTTP session"""
+        try:
+            if self._http is not None and not self._http.closed:
+                await self._http.close()
+                
+        except Exception as e:
+            logger.error(f"Error closing whitelabel HTTP session: {str(e)}")
+
+    async def _post_webhook(self, session: aiohttp.ClientSession, url: str, body: bytes) -> None:
+        """Send one webhook notification"""
+        async with session.post(url, data=body, headers={"Content-Type": "application/json"}) as response:
+            if response.status != 200:
+                logger.warning(f"Webhook notification failed: {url}")
+
     async def _notify_webhooks(self, client_id: str, event: str, data: Dict[str, Any]) -> None:
         """Notify registered webhooks of configuration changes"""
         try:
-            async with aiohttp.ClientSession() as session:
-                for handler in self.webhook_handlers:
-                    if event in handler["events"]:
-                        try:
-                            payload = {
-                                "client_id": client_id,
-                                "event": event,
-                                "timestamp": datetime.now().isoformat(),
-                                "data": data
-                            }
-                            
-                            async with session.post(handler["url"], json=payload) as response:
-                                if response.status != 200:
-                                    logger.warning(f"Webhook notification failed: {handler['url']}")
-                                    
-                        except Exception as e:
-                            logger.error(f"Error notifying webhook: {str(e)}")
-                            continue
-                            
+            urls = [handler["url"] for handler in self.webhook_handlers if event in handler["events"]]
+            if not urls:
+                return
+            
+            body = orjson.dumps({
+                "client_id": client_id,
+                "event": event,
+                "timestamp": datetime.now().isoformat(),
+                "data": data
+            })
+            
+            # Post to every webhook at once; one failing endpoint doesn't affect the rest
+            session = await self._ensure_session()
+            results = await asyncio.gather(
+                *(self._post_webhook(session, url, body) for url in urls),
+                return_exceptions=True
+            )
+            for url, result in zip(urls, results):
+                if isinstance(result, BaseException):
+                    logger.error(f"Error notifying webhook {url}: {str(result)}")
+                    
         except Exception as e:
             logger.error(f"Error in webhook notification: {str(e)}")
             capture_exception(e)
 
-    def _record_change(self, client_id: str, action: str) -> None:
-        """Record configuration change in history"""
-        self.change_history.append({
+    async def _record_change(self, client_id: str, action: str) -> None:
+        """Record configuration change in history and the change log"""
+        change = {
             "timestamp": datetime.now().isoformat(),
             "client_id": client_id,
             "action": action
-        })
+        }
+        
+        # The oldest change is also the oldest entry in its client's history
+        if len(self.change_history) == self.change_history.maxlen:
+            oldest = self.change_history.popleft()
+            client_changes = self._changes_by_client[oldest["client_id"]]
+            client_changes.popleft()
+            if not client_changes:
+                del self._changes_by_client[oldest["client_id"]]
+        self.change_history.append(change)
+        self._changes_by_client[client_id].append(change)
+        
+        try:
+            await asyncio.to_thread(_append_line, self.change_log_path, orjson.dumps(change) + b"\n")
+            
+        except Exception as e:
+            logger.error(f"Error writing change log: {str(e)}")
+            capture_exception(e)
 
     async def get_change_history(self, client_id: Optional[str] = None) -> List[Dict[str, Any]]:
-        """Get configuration change history"""
+        """Get recent configuration changes; older ones are in the change log"""
         if client_id:
-            return [c for c in self.change_history if c["client_id"] == client_id]
-        return self.change_history
+            return list(self._changes_by_client.get(client_id, ()))
+        return list(self.change_history)
 
     async def validate_config(self, config: Dict[str, Any]) -> bool:
         """Validate client configuration"""
         try:
-            required_fields = ["branding", "features", "integrations", "customization", "security"]
-            
-            # Check required fields
-            if not all(field in config for field in required_fields):
-                return False
-            
-            # Validate branding
-            if not all(field in config["branding"] for field in ["company_name", "primary_color"]):
-                return False
-            
-            # Validate features
-            if not isinstance(config["features"], dict):
-                return False
-            
-            # Validate security
-            if not isinstance(config["security"], dict) or "require_authentication" not in config["security"]:
-                return False
-            
+            msgspec.convert(config, ClientConfig)
             return True
             
+        except msgspec.ValidationError as e:
+            logger.warning(f"Invalid client config: {str(e)}")
+            return False
         except Exception as e:
             logger.error(f"Error validating config: {str(e)}")
             capture_exception(e)
@@ -15,6 +15,7 @@ class PluginManager:
         self.config = config
         self.plugins = {}
         self._initialize_plugins()
+        self._build_command_dispatch()
         
         logger.info("Plugin Manager initialized successfully")
 
@@ -58,6 +59,62 @@ class PluginManager:
             logger.error(f"Error initializing plugins: {str(e)}")
             raise
 
+    def _build_command_dispatch(self) -> None:
+        """Build command tables for the active plugins; handlers take the incoming message"""
+        # Commands are "<prefix>_<command>"; the prefix selects the plugin
+        self._command_handlers = {
+            "voice": ("voice_command", self._handle_voice_command),
+            "crm": ("crm", self._handle_crm_command),
+            "social": ("social_media", self._handle_social_command),
+            "msg": ("messaging", self._handle_messaging_command),
+            "analytics": ("analytics", self._handle_analytics_command)
+        }
+
+        crm = self.plugins.get("crm")
+        self._crm_dispatch = {
+            "sync": lambda message: crm.sync_all(),
+            "create_contact": lambda message: crm.create_contact(message["data"]),
+            "get_customer": lambda message: crm.get_customer_info(message["data"]["email"])
+        } if crm else {}
+
+        social = self.plugins.get("social_media")
+        self._social_dispatch = {
+            "post": lambda message: social.post_to_all(message["data"]),
+            "analytics": lambda message: social.get_analytics()
+        } if social else {}
+
+        messaging = self.plugins.get("messaging")
+        self._messaging_dispatch = {
+            "email": lambda message: messaging.send_email(
+                message["data"]["to"],
+                message["data"]["subject"],
+                message["data"]["content"]
+            ),
+            "sms": lambda message: messaging.send_sms(
+                message["data"]["to"],
+                message["data"]["message"]
+            ),
+            "bulk_email": lambda message: messaging.send_bulk_email(
+                message["data"]["recipients"],
+                message["data"]["subject"],
+                message["data"]["content"]
+            ),
+            "bulk_sms": lambda message: messaging.send_bulk_sms(
+                message["data"]["recipients"],
+                message["data"]["message"]
+            )
+        } if messaging else {}
+
+        analytics = self.plugins.get("analytics")
+        self._analytics_dispatch = {
+            "report": lambda message: analytics.generate_report(
+                message["data"]["report_type"],
+                message["data"].get("start_date"),
+                message["data"].get("end_date"),
+                message["data"].get("filters")
+            )
+        } if analytics else {}
+
     def get_plugin(self, plugin_name: str) -> Optional[Any]:
         """Get a plugin instance by name"""
         return self.plugins.get(plugin_name)
@@ -93,45 +150,13 @@ class PluginManager:
 
             # Process automation commands
             if message.get("command"):
-                if message["command"] == "voice" and "voice_command" in self.plugins:
-                    voice_response = await self.plugins["voice_command"].process_voice_message(
-                        message["voice_file"]
-                    )
-                    response["responses"].append({
-                        "plugin": "voice_command",
-                        "response": voice_response
-                    })
-                    response["processed"] = True
-
-                elif message["command"].startswith("crm_") and "crm" in self.plugins:
-                    crm_response = await self._handle_crm_command(message)
+                prefix, _, command = message["command"].partition("_")
+                plugin_key, handler = self._command_handlers.get(prefix, (None, None))
+                if plugin_key in self.plugins:
+                    result = await handler(command, message)
                     response["responses"].append({
-                        "plugin": "crm",
-                        "response": crm_response
-                    })
-                    response["processed"] = True
-
-                elif message["command"].startswith("social_") and "social_media" in self.plugins:
-                    social_response = await self._handle_social_command(message)
-                    response["responses"].append({
-                        "plugin": "social_media",
-                        "response": social_response
-                    })
-                    response["processed"] = True
-
-                elif message["command"].startswith("msg_") and "messaging" in self.plugins:
-                    messaging_response = await self._handle_messaging_command(message)
-                    response["responses"].append({
-                        "plugin": "messaging",
-                        "response": messaging_response
-                    })
-                    response["processed"] = True
-
-                elif message["command"].startswith("analytics_") and "analytics" in self.plugins:
-                    analytics_response = await self._handle_analytics_command(message)
-                    response["responses"].append({
-                        "plugin": "analytics",
-                        "response": analytics_response
+                        "plugin": plugin_key,
+                        "response": result
                     })
                     response["processed"] = True
 
@@ -142,92 +167,55 @@ class PluginManager:
             response["errors"].append(str(e))
             return response
 
-    async def _handle_crm_command(self, message: Dict[str, Any]) -> Dict[str, Any]:
+    async def _handle_voice_command(self, command: str, message: Dict[str, Any]) -> Dict[str, Any]:
+        """Handle voice command processing"""
+        return await self.plugins["voice_command"].process_voice_message(
+            message["voice_file"]
+        )
+
+    async def _handle_crm_command(self, command: str, message: Dict[str, Any]) -> Dict[str, Any]:
         """Handle CRM-related commands"""
         try:
-            crm_plugin = self.plugins["crm"]
-            command = message["command"].replace("crm_", "")
-
-            if command == "sync":
-                return await crm_plugin.sync_all()
-            elif command == "create_contact":
-                return await crm_plugin.create_contact(message["data"])
-            elif command == "get_customer":
-                return await crm_plugin.get_customer_info(message["data"]["email"])
-            else:
+            handler = self._crm_dispatch.get(command)
+            if handler is None:
                 raise ValueError(f"Unknown CRM command: {command}")
+            return await handler(message)
 
         except Exception as e:
             logger.error(f"Error handling CRM command: {str(e)}")
             raise
 
-    async def _handle_social_command(self, message: Dict[str, Any]) -> Dict[str, Any]:
+    async def _handle_social_command(self, command: str, message: Dict[str, Any]) -> Dict[str, Any]:
         """Handle social media-related commands"""
         try:
-            social_plugin = self.plugins["social_media"]
-            command = message["command"].replace("social_", "")
-
-            if command == "post":
-                return await social_plugin.post_to_all(message["data"])
-            elif command == "analytics":
-                return await social_plugin.get_analytics()
-            else:
+            handler = self._social_dispatch.get(command)
+            if handler is None:
                 raise ValueError(f"Unknown social media command: {command}")
+            return await handler(message)
 
         except Exception as e:
             logger.error(f"Error handling social media command: {str(e)}")
             raise
 
-    async def _handle_messaging_command(self, message: Dict[str, Any]) -> Dict[str, Any]:
+    async def _handle_messaging_command(self, command: str, message: Dict[str, Any]) -> Dict[str, Any]:
         """Handle messaging-related commands"""
         try:
-            messaging_plugin = self.plugins["messaging"]
-            command = message["command"].replace("msg_", "")
-
-            if command == "email":
-                return await messaging_plugin.send_email(
-                    message["data"]["to"],
-                    message["data"]["subject"],
-                    message["data"]["content"]
-                )
-            elif command == "sms":
-                return await messaging_plugin.send_sms(
-                    message["data"]["to"],
-                    message["data"]["message"]
-                )
-            elif command == "bulk_email":
-                return await messaging_plugin.send_bulk_email(
-                    message["data"]["recipients"],
-                    message["data"]["subject"],
-                    message["data"]["content"]
-                )
-            elif command == "bulk_sms":
-                return await messaging_plugin.send_bulk_sms(
-                    message["data"]["recipients"],
-                    message["data"]["message"]
-                )
-            else:
+            handler = self._messaging_dispatch.get(command)
+            if handler is None:
                 raise ValueError(f"Unknown messaging command: {command}")
+            return await handler(message)
 
         except Exception as e:
             logger.error(f"Error handling messaging command: {str(e)}")
             raise
 
-    async def _handle_analytics_command(self, message: Dict[str, Any]) -> Dict[str, Any]:
+    async def _handle_analytics_command(self, command: str, message: Dict[str, Any]) -> Dict[str, Any]:
         """Handle analytics-related commands"""
         try:
-            analytics_plugin = self.plugins["analytics"]
-            command = message["command"].replace("analytics_", "")
-
-            if command == "report":
-                return await analytics_plugin.generate_report(
-                    message["data"]["report_type"],
-                    message["data"].get("start_date"),
-                    message["data"].get("end_date"),
-                    message["data"].get("filters")
-                )
-            else:
+            handler = self._analytics_dispatch.get(command)
+            if handler is None:
                 raise ValueError(f"Unknown analytics command: {command}")
+            return await handler(message)
 
         except Exception as e:
             logger.error(f"Error handling analytics command: {str(e)}")
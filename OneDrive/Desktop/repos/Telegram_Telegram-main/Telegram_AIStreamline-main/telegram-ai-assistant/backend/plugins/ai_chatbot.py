@@ -1,10 +1,25 @@
+import asyncio
 import logging
 import openai
-from typing import Dict, Any, Optional
+from collections import defaultdict, deque
+from typing import Deque, Dict, Any, Optional, Tuple
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_HISTORY_LIMIT = 50
+DEFAULT_MAX_CONCURRENCY = 8
+CONTEXT_WINDOW = 5  # recent messages sent to OpenAI with each request
+
+SYSTEM_PROMPT = """You are an AI-powered business assistant with the following capabilities:
+        - Answering questions about business operations
+        - Helping with CRM, social media, and marketing tasks
+        - Providing analytics and insights
+        - Assisting with email and SMS automation
+        
+        Please be professional, concise, and helpful in your responses."""
+_SYSTEM_MSG = {"role": "system", "content": SYSTEM_PROMPT}
+
 class AIChatbot:
     def __init__(self, config: Dict[str, Any]):
         """Initialize the AI chatbot with configuration"""
@@ -15,41 +30,52 @@ class AIChatbot:
         # Set OpenAI API key
         openai.api_key = self.openai_config["api_key"]
         
-        # Initialize conversation history
-        self.conversations: Dict[int, list] = {}  # user_id -> conversation history
+        # Initialize conversation history; each user keeps only their most
+        # recent messages
+        history_limit = self.openai_config.get("history_limit", DEFAULT_HISTORY_LIMIT)
+        self.conversations: Dict[int, Deque[Dict[str, Any]]] = defaultdict(
+            lambda: deque(maxlen=history_limit)
+        )  # user_id -> conversation history
+        # user_id -> recent messages exactly as sent to OpenAI
+        context_window = min(CONTEXT_WINDOW, history_limit)
+        self._wire_history: Dict[int, Deque[Dict[str, str]]] = defaultdict(
+            lambda: deque(maxlen=context_window)
+        )
+
+        # Cap concurrent OpenAI calls and share identical in-flight requests
+        self._openai_sem = asyncio.Semaphore(
+            self.openai_config.get("max_concurrency", DEFAULT_MAX_CONCURRENCY)
+        )
+        self._inflight: Dict[Tuple, asyncio.Future] = {}
         
         logger.info("AI Chatbot initialized successfully")
 
     async def process_message(self, user_id: int, message: str) -> str:
         """Process a message and return AI response"""
         try:
-            # Initialize conversation history for new users
-            if user_id not in self.conversations:
-                self.conversations[user_id] = []
-            
             # Add user message to conversation history
-            self.conversations[user_id].append({
+            conversation = self.conversations[user_id]
+            wire_history = self._wire_history[user_id]
+            conversation.append({
                 "role": "user",
                 "content": message,
                 "timestamp": datetime.now().isoformat()
             })
+            wire_history.append({"role": "user", "content": message})
             
             # Prepare conversation for OpenAI
-            messages = [
-                {"role": "system", "content": self._get_system_prompt()},
-                *[{"role": msg["role"], "content": msg["content"]} 
-                  for msg in self.conversations[user_id][-5:]]  # Keep last 5 messages for context
-            ]
+            messages = [_SYSTEM_MSG, *wire_history]
             
             # Get response from OpenAI
             response = await self._get_openai_response(messages)
             
             # Add AI response to conversation history
-            self.conversations[user_id].append({
+            conversation.append({
                 "role": "assistant",
                 "content": response,
                 "timestamp": datetime.now().isoformat()
             })
+            wire_history.append({"role": "assistant", "content": response})
             
             return response
             
@@ -59,23 +85,32 @@ class AIChatbot:
 
     def _get_system_prompt(self) -> str:
         """Get the system prompt for AI context"""
-        return """You are an AI-powered business assistant with the following capabilities:
-        - Answering questions about business operations
-        - Helping with CRM, social media, and marketing tasks
-        - Providing analytics and insights
-        - Assisting with email and SMS automation
-        
-        Please be professional, concise, and helpful in your responses."""
+        return SYSTEM_PROMPT
 
     async def _get_openai_response(self, messages: list) -> str:
-        """Get response from OpenAI API"""
+        """Get response from OpenAI API, joining an identical request already in flight"""
+        key = (
+            self.openai_config["model"],
+            tuple((msg["role"], msg["content"]) for msg in messages)
+        )
+        request = self._inflight.get(key)
+        if request is None:
+            request = asyncio.ensure_future(self._request_openai_response(messages))
+            self._inflight[key] = request
+            request.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # Shield so one cancelled caller does not cancel the shared request
+        return await asyncio.shield(request)
+
+    async def _request_openai_response(self, messages: list) -> str:
+        """Send a chat completion request to OpenAI"""
         try:
-            response = await openai.ChatCompletion.acreate(
-                model=self.openai_config["model"],
-                messages=messages,
-                temperature=self.openai_config["temperature"],
-                max_tokens=self.openai_config["max_tokens"]
-            )
+            async with self._openai_sem:
+                response = await openai.ChatCompletion.acreate(
+                    model=self.openai_config["model"],
+                    messages=messages,
+                    temperature=self.openai_config["temperature"],
+                    max_tokens=self.openai_config["max_tokens"]
+                )
             return response.choices[0].message.content.strip()
             
         except openai.error.RateLimitError:
@@ -93,6 +128,7 @@ class AIChatbot:
 
     def clear_conversation(self, user_id: int) -> None:
         """Clear conversation history for a user"""
+        self._wire_history.pop(user_id, None)
         if user_id in self.conversations:
             self.conversations.pop(user_id)
             logger.info(f"Cleared conversation history for user {user_id}")
@@ -118,4 +154,4 @@ class AIChatbot:
 
     def get_conversation_history(self, user_id: int) -> list:
         """Get the conversation history for a user"""
-        return self.conversations.get(user_id, [])
+        return list(self.conversations.get(user_id, ()))
@@ -25,6 +25,15 @@ class VoiceCommand:
         if self.stt_config["provider"] == "google":
             self.speech_client = speech_v1.SpeechClient()
         
+        # Command keywords and their handlers, checked in order
+        self._command_handlers = (
+            ("status", self._handle_status_command),
+            ("report", self._handle_report_command),
+            ("post", self._handle_social_post_command),
+            ("email", self._handle_email_command),
+            ("help", self._handle_help_command)
+        )
+        
         logger.info("Voice Command processor initialized successfully")
 
     async def process_voice_message(self, voice_file_path: str) -> Tuple[bool, str]:
@@ -36,12 +45,12 @@ class VoiceCommand:
             # Convert voice message to suitable format
             audio_path = await self._convert_audio(voice_file_path)
             
-            # Perform speech-to-text
-            success, text = await self._speech_to_text(audio_path)
-            
-            # Clean up temporary files
-            if os.path.exists(audio_path):
-                os.remove(audio_path)
+            # Perform speech-to-text, cleaning up the temporary file either way
+            try:
+                success, text = await self._speech_to_text(audio_path)
+            finally:
+                if os.path.exists(audio_path):
+                    os.remove(audio_path)
             
             if not success:
                 return False, "Failed to process voice command. Please try again."
@@ -56,18 +65,23 @@ class VoiceCommand:
     async def _convert_audio(self, voice_file_path: str) -> str:
         """Convert voice message to suitable audio format"""
         try:
-            # Create temporary directory if it doesn't exist
-            temp_dir = "temp"
-            os.makedirs(temp_dir, exist_ok=True)
-            
-            # Generate temporary file path
-            temp_path = os.path.join(temp_dir, f"audio_{os.path.basename(voice_file_path)}.wav")
+            # Create a unique temporary file in the system temp directory
+            # (usually RAM-backed tmpfs on Linux) unless one is configured
+            fd, temp_path = tempfile.mkstemp(
+                suffix=".wav",
+                dir=self.stt_config.get("temp_dir", tempfile.gettempdir())
+            )
             
             # Convert to WAV format
-            audio = AudioSegment.from_file(voice_file_path)
-            audio = audio.set_channels(1)  # Convert to mono
-            audio = audio.set_frame_rate(16000)  # Set sample rate to 16kHz
-            audio.export(temp_path, format="wav")
+            try:
+                with os.fdopen(fd, "wb") as temp_file:
+                    audio = AudioSegment.from_file(voice_file_path)
+                    audio = audio.set_channels(1)  # Convert to mono
+                    audio = audio.set_frame_rate(16000)  # Set sample rate to 16kHz
+                    audio.export(temp_file, format="wav")
+            except Exception:
+                os.remove(temp_path)
+                raise
             
             return temp_path
             
@@ -135,17 +149,8 @@ class VoiceCommand:
             # Convert text to lowercase for easier matching
             text = text.lower()
             
-            # Define command keywords and their handlers
-            commands = {
-                "status": self._handle_status_command,
-                "report": self._handle_report_command,
-                "post": self._handle_social_post_command,
-                "email": self._handle_email_command,
-                "help": self._handle_help_command
-            }
-            
             # Check for matching commands
-            for keyword, handler in commands.items():
+            for keyword, handler in self._command_handlers:
                 if keyword in text:
                     return await handler(text)
             
@@ -348,6 +348,14 @@ class TelegramBot:
 if __name__ == "__main__":
     from config import load_config
 
+    # Run the bot on uvloop's event loop where available; uvloop does not
+    # support Windows, so fall back to the default asyncio loop there
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        logger.info("uvloop not available, using the default asyncio event loop")
+
     config = load_config()
     plugin_manager = PluginManager()
 
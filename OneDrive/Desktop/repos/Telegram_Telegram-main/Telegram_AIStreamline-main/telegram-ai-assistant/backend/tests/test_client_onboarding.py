@@ -0,0 +1,14 @@
+import pytest
+from unittest.mock import AsyncMock, Mock
+from modules.client_onboarding import ClientOnboarding
+from modules.whitelabel_config import WhitelabelConfig
+
+@pytest.mark.asyncio
+async def test_close_closes_whitelabel_webhook_session():
+    onboarding = ClientOnboarding.__new__(ClientOnboarding)
+    onboarding.whitelabel = WhitelabelConfig.__new__(WhitelabelConfig)
+    onboarding.whitelabel._http = Mock(closed=False, close=AsyncMock())
+
+    await onboarding.close()
+
+    onboarding.whitelabel._http.close.assert_awaited_once()
@@ -2,14 +2,14 @@ import pytest
 import stripe
 import paypalrestsdk
 from unittest.mock import Mock, patch
-from datetime import datetime
 from modules.payment_gateway import PaymentGateway
 
 @pytest.fixture
-def config():
+def config(tmp_path):
     return {
         "plugins": {
             "payment_gateway": {
+                "data_dir": str(tmp_path),
                 "stripe": {
                     "enabled": True,
                     "secret_key": "test_stripe_key",
@@ -70,6 +70,64 @@ async def test_process_stripe_payment_success(payment_gateway, stripe_payment_da
         assert result["status"] == "succeeded"
         assert result["client_secret"] == "secret_123"
 
+@pytest.mark.asyncio
+async def test_process_payments_bulk(payment_gateway, stripe_payment_data):
+    mock_intent = Mock()
+    mock_intent.id = "pi_123"
+    mock_intent.status = "succeeded"
+    mock_intent.client_secret = "secret_123"
+    batch = [
+        stripe_payment_data,
+        {**stripe_payment_data, "order_id": "order_456"},
+        {**stripe_payment_data, "gateway": "unknown"}
+    ]
+
+    with patch.object(stripe.PaymentIntent, 'create', return_value=mock_intent) as mock_create:
+        results = await payment_gateway.process_payments_bulk(batch)
+        
+        assert [r["success"] for r in results] == [True, True, False]
+        idempotency_keys = [c.kwargs["idempotency_key"] for c in mock_create.call_args_list]
+        assert len(set(idempotency_keys)) == 2
+        assert {key.rsplit("_", 1)[0] for key in idempotency_keys} == {"payment_order_123", "payment_order_456"}
+
+        # Re-running the same batch reuses the keys, so Stripe deduplicates it
+        await payment_gateway.process_payments_bulk(batch)
+        rerun_keys = [c.kwargs["idempotency_key"] for c in mock_create.call_args_list[2:]]
+        assert set(rerun_keys) == set(idempotency_keys)
+
+@pytest.mark.asyncio
+async def test_stripe_retry_with_other_card_uses_new_idempotency_key(payment_gateway, stripe_payment_data):
+    mock_intent = Mock()
+    mock_intent.id = "pi_456"
+    mock_intent.status = "succeeded"
+    mock_intent.client_secret = "secret_456"
+
+    with patch.object(stripe.PaymentIntent, 'create', side_effect=[
+        stripe.error.CardError("Card declined", "card_declined", "error_code"),
+        mock_intent
+    ]) as mock_create:
+        declined = await payment_gateway._process_stripe_payment(stripe_payment_data)
+        retried = await payment_gateway._process_stripe_payment(
+            {**stripe_payment_data, "payment_method": "pm_card_mastercard"}
+        )
+
+        assert declined["success"] is False
+        assert retried["success"] is True
+        first_key, second_key = (c.kwargs["idempotency_key"] for c in mock_create.call_args_list)
+        assert first_key != second_key
+
+@pytest.mark.asyncio
+async def test_stripe_payment_uses_caller_idempotency_key(payment_gateway, stripe_payment_data):
+    mock_intent = Mock()
+    mock_intent.id = "pi_789"
+    mock_intent.status = "succeeded"
+    mock_intent.client_secret = "secret_789"
+
+    with patch.object(stripe.PaymentIntent, 'create', return_value=mock_intent) as mock_create:
+        await payment_gateway._process_stripe_payment({**stripe_payment_data, "idempotency_key": "attempt_1"})
+
+        assert mock_create.call_args.kwargs["idempotency_key"] == "attempt_1"
+
 @pytest.mark.asyncio
 async def test_process_stripe_payment_failure(payment_gateway, stripe_payment_data):
     with patch.object(stripe.PaymentIntent, 'create', side_effect=stripe.error.CardError(
@@ -129,6 +187,27 @@ async def test_get_payment_status_stripe(payment_gateway):
         assert result["currency"] == "usd"
         assert "metadata" in result
 
+@pytest.mark.asyncio
+async def test_get_payment_status_terminal_uses_local_record(payment_gateway):
+    payment_gateway._record_payment({
+        "gateway": "stripe",
+        "amount": 100.00,
+        "currency": "usd",
+        "status": "succeeded",
+        "payment_id": "pi_123",
+        "customer_id": "cust_123",
+        "order_id": "order_123"
+    })
+
+    with patch.object(stripe.PaymentIntent, 'retrieve') as mock_retrieve:
+        result = await payment_gateway.get_payment_status("pi_123", "stripe")
+        
+        mock_retrieve.assert_not_called()
+        assert result["success"] is True
+        assert result["status"] == "succeeded"
+        assert result["amount"] == 100.00
+        assert result["metadata"]["order_id"] == "order_123"
+
 @pytest.mark.asyncio
 async def test_get_payment_status_paypal(payment_gateway):
     mock_payment = Mock()
@@ -188,26 +267,22 @@ async def test_refund_payment_paypal(payment_gateway):
 @pytest.mark.asyncio
 async def test_get_payment_history(payment_gateway):
     # Add some test payments to history
-    payment_gateway.payment_history = [
-        {
-            "gateway": "stripe",
-            "amount": 100.00,
-            "currency": "usd",
-            "status": "succeeded",
-            "payment_id": "pi_123",
-            "customer_id": "cust_123",
-            "timestamp": datetime.now().isoformat()
-        },
-        {
-            "gateway": "paypal",
-            "amount": 50.00,
-            "currency": "USD",
-            "status": "completed",
-            "payment_id": "PAY-123",
-            "customer_id": "cust_456",
-            "timestamp": datetime.now().isoformat()
-        }
-    ]
+    payment_gateway._record_payment({
+        "gateway": "stripe",
+        "amount": 100.00,
+        "currency": "usd",
+        "status": "succeeded",
+        "payment_id": "pi_123",
+        "customer_id": "cust_123"
+    })
+    payment_gateway._record_payment({
+        "gateway": "paypal",
+        "amount": 50.00,
+        "currency": "USD",
+        "status": "completed",
+        "payment_id": "PAY-123",
+        "customer_id": "cust_456"
+    })
 
     # Test filtering by customer
     history = await payment_gateway.get_payment_history(customer_id="cust_123")
@@ -219,31 +294,80 @@ async def test_get_payment_history(payment_gateway):
     assert len(history) == 1
     assert history[0]["gateway"] == "paypal"
 
+    # Test filtering by customer and gateway together
+    history = await payment_gateway.get_payment_history(customer_id="cust_123", gateway="paypal")
+    assert history == []
+
     # Test limit
     history = await payment_gateway.get_payment_history(limit=1)
     assert len(history) == 1
+    assert history[0]["payment_id"] == "PAY-123"
 
 @pytest.mark.asyncio
-async def test_get_analytics(payment_gateway):
-    # Add some test payments to history
-    payment_gateway.payment_history = [
-        {
+async def test_payment_history_spills_evicted_payments(config, tmp_path):
+    config["plugins"]["payment_gateway"]["history_limit"] = 2
+    config["plugins"]["payment_gateway"]["history_spill_path"] = str(tmp_path / "payments.jsonl")
+    payment_gateway = PaymentGateway(config)
+
+    for i in range(5):
+        payment_gateway._record_payment({
             "gateway": "stripe",
-            "amount": 100.00,
+            "amount": 10.00,
             "currency": "usd",
             "status": "succeeded",
-            "payment_id": "pi_123",
-            "timestamp": datetime.now().isoformat()
-        },
-        {
-            "gateway": "paypal",
-            "amount": 50.00,
-            "currency": "USD",
-            "status": "completed",
-            "payment_id": "PAY-123",
-            "timestamp": datetime.now().isoformat()
-        }
-    ]
+            "payment_id": f"pi_{i}",
+            "customer_id": "cust_123"
+        })
+    await payment_gateway.shutdown()
+
+    assert len(payment_gateway.payment_history) == 2
+
+    # Older payments are served from the spill file
+    history = await payment_gateway.get_payment_history(customer_id="cust_123", limit=4)
+    assert [p["payment_id"] for p in history] == ["pi_1", "pi_2", "pi_3", "pi_4"]
+
+    analytics = await payment_gateway.get_analytics()
+    assert analytics["total_payments"] == 5
+
+@pytest.mark.asyncio
+async def test_payment_history_spills_to_data_dir(config, tmp_path):
+    config["plugins"]["payment_gateway"]["history_limit"] = 1
+
+    async with PaymentGateway(config) as payment_gateway:
+        for i in range(3):
+            payment_gateway._record_payment({
+                "gateway": "paypal",
+                "amount": 5.00,
+                "currency": "USD",
+                "status": "approved",
+                "payment_id": f"PAY-{i}"
+            })
+
+    assert (tmp_path / "payments.jsonl").read_bytes().count(b"\n") == 2
+
+def test_payment_gateway_requires_spill_location(config):
+    del config["plugins"]["payment_gateway"]["data_dir"]
+
+    with pytest.raises(ValueError):
+        PaymentGateway(config)
+
+@pytest.mark.asyncio
+async def test_get_analytics(payment_gateway):
+    # Add some test payments to history
+    payment_gateway._record_payment({
+        "gateway": "stripe",
+        "amount": 100.00,
+        "currency": "usd",
+        "status": "succeeded",
+        "payment_id": "pi_123"
+    })
+    payment_gateway._record_payment({
+        "gateway": "paypal",
+        "amount": 50.00,
+        "currency": "USD",
+        "status": "completed",
+        "payment_id": "PAY-123"
+    })
 
     analytics = await payment_gateway.get_analytics()
     
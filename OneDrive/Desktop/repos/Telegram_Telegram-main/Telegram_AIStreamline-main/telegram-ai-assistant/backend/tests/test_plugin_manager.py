@@ -0,0 +1,24 @@
+import pytest
+from unittest.mock import AsyncMock, Mock
+from modules import PluginManager
+
+@pytest.fixture
+def plugin_manager():
+    manager = PluginManager.__new__(PluginManager)
+    manager.plugins = {}
+    return manager
+
+@pytest.mark.asyncio
+async def test_close_closes_plugin_http_sessions(plugin_manager):
+    voice_command = Mock(close=AsyncMock())
+    social_media = Mock(close=AsyncMock())
+    plugin_manager.plugins = {
+        "ai_chatbot": Mock(),
+        "voice_command": voice_command,
+        "social_media": social_media
+    }
+
+    await plugin_manager.close()
+
+    voice_command.close.assert_awaited_once()
+    social_media.close.assert_awaited_once()
@@ -0,0 +1,40 @@
+import pytest
+from datetime import datetime
+from decimal import Decimal
+from modules.pricing_manager import PricingManager
+
+@pytest.fixture
+def pricing_manager():
+    return PricingManager({})
+
+def test_payment_fees_keep_sub_micro_precision(pricing_manager):
+    result = pricing_manager.calculate_payment_fees(Decimal("33.333333"), "credit_card", "stripe")
+
+    assert result["success"] is True
+    assert result["breakdown"]["percentage_fee"] == pytest.approx(0.966666657, abs=1e-12)
+    assert result["fee_amount"] == pytest.approx(1.266666657, abs=1e-12)
+
+def test_crypto_fees_keep_small_amounts(pricing_manager):
+    result = pricing_manager.calculate_payment_fees(Decimal("0.00012345"), "crypto", "coinbase")
+
+    assert result["breakdown"]["base_amount"] == pytest.approx(0.00012345, abs=1e-15)
+    assert result["fee_amount"] == pytest.approx(0.0000012345, abs=1e-15)
+
+def test_idle_usage_is_free(pricing_manager):
+    result = pricing_manager.calculate_usage_cost({"ai_tokens": {"gpt-4": 0}, "storage": 0, "api_calls": 0})
+
+    assert result == {"success": True, "total_cost": 0.0, "breakdown": {}}
+
+def test_idle_usage_still_rejects_unknown_model(pricing_manager):
+    result = pricing_manager.calculate_usage_cost({"ai_tokens": {"bogus": 0}})
+
+    assert result["success"] is False
+
+@pytest.mark.asyncio
+async def test_track_usage_reports_last_updated_as_iso_string(pricing_manager):
+    result = await pricing_manager.track_usage("user_1", "api_calls", 3)
+    report = await pricing_manager.get_usage_report("user_1")
+
+    assert result["current_usage"]["api_calls"] == 3
+    assert result["current_usage"]["last_updated"] == report["last_updated"]
+    datetime.fromisoformat(result["current_usage"]["last_updated"])
@@ -0,0 +1,18 @@
+import pytest
+from unittest.mock import AsyncMock, Mock
+from modules.telegram_marketing_bot import TelegramMarketingBot
+
+@pytest.mark.asyncio
+async def test_stop_closes_owned_services():
+    bot = TelegramMarketingBot.__new__(TelegramMarketingBot)
+    bot.application = Mock(stop=AsyncMock(), shutdown=AsyncMock())
+    bot.application.updater.running = False
+    bot.payment = Mock(close=AsyncMock())
+    bot.content = Mock(close=AsyncMock())
+    bot.http = None
+
+    await bot.stop()
+
+    bot.payment.close.assert_awaited_once()
+    bot.content.close.assert_awaited_once()
+    bot.application.shutdown.assert_awaited_once()
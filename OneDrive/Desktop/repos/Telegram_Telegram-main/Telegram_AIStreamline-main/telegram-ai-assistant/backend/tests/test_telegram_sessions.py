@@ -0,0 +1,125 @@
+import asyncio
+import itertools
+import pytest
+from unittest.mock import AsyncMock, Mock
+from modules.telegram_marketing_bot import TelegramMarketingBot
+
+class FakePipeline:
+    """Buffers commands and applies them to a FakeRedis on execute"""
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        def buffer(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+            return self
+        return buffer
+
+    async def execute(self):
+        return [await getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.commands]
+
+class FakeRedis:
+    """In-memory stand-in for the redis.asyncio commands the bot uses"""
+    def __init__(self):
+        self.hashes = {}
+        self.counters = {}
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def hgetall(self, key):
+        return {field: value.decode() for field, value in self.hashes.get(key, {}).items()}
+
+    async def hset(self, key, mapping):
+        self.hashes.setdefault(key, {}).update(mapping)
+        return len(mapping)
+
+    async def hsetnx(self, key, field, value):
+        fields = self.hashes.setdefault(key, {})
+        if field in fields:
+            return 0
+        fields[field] = value
+        return 1
+
+    async def delete(self, key):
+        return int(self.hashes.pop(key, None) is not None)
+
+    async def expire(self, key, seconds):
+        return True
+
+    async def incr(self, key):
+        self.counters[key] = self.counters.get(key, 0) + 1
+        return self.counters[key]
+
+@pytest.fixture
+def bot():
+    bot = TelegramMarketingBot.__new__(TelegramMarketingBot)
+    bot.redis = FakeRedis()
+    bot.ai_chatbot = Mock()
+    bot._ticket_epoch = 0
+    bot._ticket_seq = itertools.count(1)
+    return bot
+
+def message_update(user_id, text):
+    update = Mock()
+    update.effective_user.id = user_id
+    update.message.text = text
+    update.message.reply_text = AsyncMock()
+    return update
+
+def callback_update():
+    update = Mock()
+    update.callback_query.message.reply_text = AsyncMock()
+    return update
+
+@pytest.mark.asyncio
+async def test_callback_state_survives_concurrent_chat_message(bot):
+    started = asyncio.Event()
+    release = asyncio.Event()
+
+    async def slow_response(text):
+        started.set()
+        await release.wait()
+        return {"message": "Hello!"}
+
+    bot.ai_chatbot.generate_response = slow_response
+    message = asyncio.create_task(bot._handle_message(message_update(1, "hi"), None))
+    await started.wait()
+
+    # The user taps "start onboarding" while the AI reply is in flight
+    await bot._handle_onboarding_callback(callback_update(), None, 1, "onboard_start")
+    release.set()
+    await message
+
+    session = await bot._load_session(1)
+    assert session["state"] == "onboarding_business_info"
+
+@pytest.mark.asyncio
+async def test_support_description_keeps_issue_type(bot):
+    await bot._handle_support_callback(callback_update(), None, 1, "support_billing")
+    update = message_update(1, "I was charged twice")
+    await bot._handle_message(update, None)
+
+    session = await bot._load_session(1)
+    assert session["state"] == "chat"
+    assert session["data"] == {"issue_type": "billing", "description": "I was charged twice"}
+    assert "TICKET_" in update.message.reply_text.call_args.args[0]
+
+@pytest.mark.asyncio
+async def test_save_session_replaces_previous_fields(bot):
+    await bot._update_session(1, state="support_description", issue_type="billing")
+    await bot._save_session(1, {"state": "onboarding_start", "data": {"step": 0}, "started_at": "2024-01-01T00:00:00+00:00"})
+
+    session = await bot._load_session(1)
+    assert session == {
+        "state": "onboarding_start",
+        "data": {"step": 0},
+        "started_at": "2024-01-01T00:00:00+00:00"
+    }
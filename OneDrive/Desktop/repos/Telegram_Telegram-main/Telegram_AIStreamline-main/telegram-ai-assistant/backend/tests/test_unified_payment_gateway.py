@@ -0,0 +1,33 @@
+import pytest
+from modules.unified_payment_gateway import UnifiedPaymentGateway
+
+@pytest.fixture
+def config(tmp_path):
+    return {
+        "plugins": {
+            "payment_gateway": {
+                "data_dir": str(tmp_path),
+                "transaction_history_limit": 2,
+                "stripe": {
+                    "secret_key": "test_stripe_key",
+                    "webhook_secret": "test_webhook_secret"
+                }
+            }
+        }
+    }
+
+@pytest.mark.asyncio
+async def test_close_flushes_evicted_transactions_to_data_dir(config, tmp_path):
+    gateway = UnifiedPaymentGateway(config)
+    for i in range(5):
+        gateway._record_transaction("credit_card", "stripe", 1000, "usd", "pending", f"pi_{i}")
+
+    await gateway.close()
+
+    assert (tmp_path / "transactions.jsonl").read_bytes().count(b"\n") == 3
+
+def test_requires_spill_location(config):
+    del config["plugins"]["payment_gateway"]["data_dir"]
+
+    with pytest.raises(ValueError):
+        UnifiedPaymentGateway(config)